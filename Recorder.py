@@ -1,74 +1,362 @@
-import stable_whisper
-import sys
+import numpy as np
+import argparse
+import json
+import multiprocessing
+import subprocess
 import os
 from datetime import timedelta
-from moviepy import VideoFileClip
+
+from engines import DEFAULT_ENGINE, ENGINES, load_engine
+from encoding import probe_duration
+
+SAMPLE_RATE = 16000
+CHUNK_SIZE = 1200
 
 def format_timestamp(seconds):
     """Convertit les secondes en format propre HH:MM:SS"""
     return str(timedelta(seconds=int(seconds)))
 
+def pcm_to_float(data):
+    samples = np.frombuffer(data[:len(data) - len(data) % 2], dtype=np.int16)
+    return samples.astype(np.float32) / 32768.0
+
+def pcm_command(video_path, sample_rate=SAMPLE_RATE, start=None, duration=None):
+    command = ["ffmpeg", "-nostdin", "-loglevel", "error"]
+    if start is not None:
+        command += ["-ss", str(start), "-t", str(duration)]
+    return command + [
+        "-i", video_path,
+        "-vn", "-ac", "1", "-ar", str(sample_rate),
+        "-f", "s16le", "-"
+    ]
+
+def stream_pcm_chunks(video_path, chunk_size, sample_rate=SAMPLE_RATE):
+    """
+    Décode uniquement la piste audio via ffmpeg (PCM 16 kHz mono) et renvoie
+    des morceaux de chunk_size secondes en float32 : aucun fichier temporaire,
+    aucune image décodée, et un seul morceau en mémoire à la fois.
+    Produit des tuples (début_en_secondes, tableau numpy).
+    """
+    process = subprocess.Popen(pcm_command(video_path, sample_rate), stdout=subprocess.PIPE)
+
+    chunk_bytes = chunk_size * sample_rate * 2
+    current_time = 0
+    try:
+        while True:
+            # read() peut rendre moins que demandé sur un pipe : on complète jusqu'à la taille du morceau
+            data = bytearray()
+            while len(data) < chunk_bytes:
+                block = process.stdout.read(chunk_bytes - len(data))
+                if not block:
+                    break
+                data += block
+            if len(data) < 2:
+                break
+            yield current_time, pcm_to_float(data)
+            current_time += chunk_size
+    finally:
+        process.stdout.close()
+        return_code = process.wait()
+    # Seulement en fin de lecture normale : un flux illisible ne doit jamais passer pour du silence
+    if return_code != 0:
+        raise RuntimeError(f"ffmpeg a quitté avec le code {return_code} en décodant {video_path}")
+
+def read_pcm(video_path, start, duration, sample_rate=SAMPLE_RATE):
+    """
+    Décode une seule plage audio [start, start + duration] (seek ffmpeg, pas de lecture depuis le début).
+    Lève subprocess.CalledProcessError si ffmpeg échoue.
+    """
+    data = subprocess.check_output(pcm_command(video_path, sample_rate, start, duration))
+    return pcm_to_float(data)
+
+# Pré-passe VAD : énergie par trame de 30 ms, calculée en streaming sur le PCM
+VAD_FRAME = 0.03
+VAD_BLOCK = 60
+
+def frame_energies(video_path, frame=VAD_FRAME, sample_rate=SAMPLE_RATE):
+    """Niveau en dBFS de chaque trame, calculé bloc par bloc (tableaux numpy, pas de boucle par échantillon)."""
+    frame_samples = int(frame * sample_rate)
+    levels = []
+    for _, audio in stream_pcm_chunks(video_path, VAD_BLOCK, sample_rate):
+        count = len(audio) // frame_samples
+        if count == 0:
+            continue
+        frames = audio[:count * frame_samples].reshape(count, frame_samples)
+        rms = np.sqrt(np.mean(frames * frames, axis=1))
+        levels.append(20 * np.log10(rms + 1e-10))
+    return np.concatenate(levels) if levels else np.zeros(0)
+
+def speech_regions(levels, frame=VAD_FRAME, threshold=None, min_silence=2.0, padding=0.3, min_speech=0.25):
+    """
+    Plages de parole en indices de trames [début, fin).
+    Seuil par défaut : bruit de fond (10e percentile) + 12 dB, jamais sous -50 dBFS.
+    Les silences plus courts que min_silence restent dans la plage (pauses entre les mots).
+    """
+    if len(levels) == 0:
+        return []
+    if threshold is None:
+        threshold = max(np.percentile(levels, 10) + 12, -50)
+    active = np.concatenate(([0], (levels > threshold).astype(np.int8), [0]))
+    edges = np.diff(active)
+    starts = np.flatnonzero(edges == 1)
+    ends = np.flatnonzero(edges == -1)
+
+    pad = int(padding / frame)
+    gap = int(min_silence / frame)
+    regions = []
+    for start, end in zip(np.maximum(starts - pad, 0), np.minimum(ends + pad, len(levels))):
+        if regions and start - regions[-1][1] < gap:
+            regions[-1][1] = end
+        else:
+            regions.append([start, end])
+    return [(start, end) for start, end in regions if (end - start) * frame >= min_speech]
+
+def plan_chunks(levels, regions, chunk_size, frame=VAD_FRAME, max_gap=10, search=30):
+    """
+    Regroupe les plages de parole en morceaux d'au plus chunk_size secondes.
+    Les silences de plus de max_gap secondes entre deux plages ne sont jamais transcrits,
+    et une plage trop longue est coupée sur la trame la plus silencieuse de ses
+    `search` dernières secondes plutôt qu'au milieu d'un mot.
+    Renvoie des plages (début, fin) en secondes.
+    """
+    limit = int(chunk_size / frame)
+    window = int(search / frame)
+    pieces = []
+    for start, end in regions:
+        while end - start > limit:
+            low = start + limit - window
+            cut = low + int(np.argmin(levels[low:start + limit]))
+            pieces.append((start, cut))
+            start = cut
+        pieces.append((start, end))
+
+    chunks = []
+    for start, end in pieces:
+        if chunks and (start - chunks[-1][1]) * frame <= max_gap and end - chunks[-1][0] <= limit:
+            chunks[-1][1] = end
+        else:
+            chunks.append([start, end])
+    return [(float(start * frame), float(end * frame)) for start, end in chunks]
+
+def vad_chunks(video_path, chunk_size, threshold=None, min_silence=2.0):
+    levels = frame_energies(video_path)
+    if len(levels) == 0:
+        raise RuntimeError(f"Aucun audio décodé dans {video_path}")
+    chunks = plan_chunks(levels, speech_regions(levels, threshold=threshold, min_silence=min_silence), chunk_size)
+    total = len(levels) * VAD_FRAME
+    speech = sum(end - start for start, end in chunks)
+    print(f"VAD : {format_timestamp(speech)} à transcrire sur {format_timestamp(total)} "
+          f"({100 * speech / max(total, 1):.0f} %), {len(chunks)} morceaux")
+    return chunks
+
+def fixed_chunks(duration, chunk_size):
+    return [
+        (start, min(start + chunk_size, duration))
+        for start in range(0, int(duration) + 1, chunk_size)
+        if start < duration
+    ]
+
+def load_model(threads=None, engine=DEFAULT_ENGINE):
+    """Moteur de transcription (engines.py), "small" de stable-whisper par défaut."""
+    return load_engine(engine, threads)
+
+def transcribe_chunk(model, audio, offset, keep_start=0, keep_end=float("inf")):
+    """
+    Transcrit un morceau et renvoie ses segments en temps global.
+    Avec recouvrement, un segment n'est gardé que par le morceau qui contient
+    son milieu : les doublons aux frontières disparaissent.
+    """
+    segments = []
+    for start, end, text in model.transcribe(audio):
+        start += offset
+        end += offset
+        if keep_start <= (start + end) / 2 < keep_end:
+            segments.append((start, end, text))
+    return segments
+
+def write_segments(f, segments, state):
+    """Écrit les segments (temps globaux, dans l'ordre) en alternant les locuteurs."""
+    for start, end, text in segments:
+        # LOGIQUE DE NUMÉROTATION :
+        # Si le silence entre deux segments est > 0.8 seconde, on change de personne.
+        # C'est ce qui permet de séparer le streamer de la série.
+        if (start - state["last_end_time"]) > 0.8:
+            state["current_speaker"] = 1 if state["current_speaker"] == 2 else 2
+
+        start_str = format_timestamp(start)
+        end_str = format_timestamp(end)
+
+        # Écriture formatée avec le Locuteur
+        f.write(f"[{start_str} - {end_str}] LOCUTEUR {state['current_speaker']} : {text}\n")
+
+        state["last_end_time"] = end
+    f.flush()
+
+# Modèle propre à chaque process du pool, chargé une seule fois par worker
+_worker_model = None
+
+def _init_worker(threads, engine=DEFAULT_ENGINE):
+    global _worker_model
+    _worker_model = load_model(threads, engine)
+
+def worker_pool(workers, threads=None, engine=DEFAULT_ENGINE):
+    """Pool de process dont chaque worker charge le modèle une seule fois (_init_worker)."""
+    # spawn : torch supporte mal le fork d'un process qui a déjà des threads
+    context = multiprocessing.get_context("spawn")
+    return context.Pool(workers, initializer=_init_worker, initargs=(threads, engine))
+
+def transcribe_range(model, video_path, start, end, overlap=0):
+    # Chaque morceau est décodé à part (seek ffmpeg) : un morceau peut être repris seul
+    if not overlap:
+        return transcribe_chunk(model, read_pcm(video_path, start, end - start), start)
+    offset = max(0, start - overlap)
+    audio = read_pcm(video_path, offset, end + overlap - offset)
+    return transcribe_chunk(model, audio, offset, start, end)
+
+def _transcribe_range(task):
+    # Chaque worker décode lui-même sa plage : pas de gros tableaux audio entre process
+    return transcribe_range(_worker_model, *task)
+
+def parallel_results(video_path, chunks, workers, threads=None, overlap=0, engine=DEFAULT_ENGINE, pool=None):
+    tasks = [(video_path, start, end, overlap) for start, end in chunks]
+    if pool is not None:
+        # Pool fourni par l'appelant (initialisé avec _init_worker) : aucun rechargement du modèle
+        yield from pool.imap(_transcribe_range, tasks)
+        return
+    with worker_pool(workers, threads, engine) as pool:
+        # imap garde l'ordre des morceaux : le fichier est écrit au fil de l'eau, dans l'ordre
+        yield from pool.imap(_transcribe_range, tasks)
+
+def plan_video(video_path, chunk_size, vad=True, vad_threshold=None, min_silence=2.0):
+    if vad:
+        return vad_chunks(video_path, chunk_size, vad_threshold, min_silence)
+    return fixed_chunks(probe_duration(video_path), chunk_size)
+
+# Point de reprise : découpage, morceaux terminés, taille du texte écrit et état des locuteurs
+def checkpoint_path(output_file):
+    return output_file + ".ckpt.json"
+
+def load_checkpoint(output_file, video_path, settings):
+    path = checkpoint_path(output_file)
+    if not os.path.exists(path) or not os.path.exists(output_file):
+        return None
+    try:
+        with open(path, encoding="utf-8") as f:
+            checkpoint = json.load(f)
+    except (OSError, ValueError) as e:
+        print(f"[WARN] Point de reprise illisible ({e}), on recommence depuis le début")
+        return None
+    # Autre vidéo ou autres réglages : les morceaux ne correspondent plus
+    if checkpoint.get("video") != os.path.abspath(video_path) or checkpoint.get("settings") != settings:
+        return None
+    if os.path.getsize(output_file) < checkpoint["offset"]:
+        return None
+    return checkpoint
+
+def save_checkpoint(output_file, checkpoint):
+    # Écriture atomique : un arrêt brutal ne laisse jamais un point de reprise tronqué
+    path = checkpoint_path(output_file)
+    with open(path + ".tmp", "w", encoding="utf-8") as f:
+        json.dump(checkpoint, f)
+    os.replace(path + ".tmp", path)
+
+def transcribe_file(video_path, output_file, chunk_size=CHUNK_SIZE, vad=True, vad_threshold=None,
+                    min_silence=2.0, overlap=0, model=None, workers=1, threads=None, restart=False, engine=DEFAULT_ENGINE, pool=None):
+    """
+    Transcrit video_path dans output_file morceau par morceau. Après chaque morceau,
+    le texte est flushé puis le point de reprise enregistré : une relance reprend
+    au premier morceau non terminé (sans refaire la VAD) avec le même état des locuteurs.
+    """
+    if model is not None:
+        engine = getattr(model, "spec", engine)
+    # Moteur inclus : une reprise avec un autre --engine mélangerait deux transcriptions
+    settings = {"chunk_size": chunk_size, "vad": vad, "vad_threshold": vad_threshold,
+                "min_silence": min_silence, "overlap": overlap, "engine": engine}
+    checkpoint = None if restart else load_checkpoint(output_file, video_path, settings)
+    if checkpoint:
+        # Ce qui a été écrit après le dernier point de reprise appartient à un morceau inachevé
+        os.truncate(output_file, checkpoint["offset"])
+        print(f"Reprise au morceau {checkpoint['done'] + 1}/{len(checkpoint['chunks'])}")
+    else:
+        checkpoint = {
+            "video": os.path.abspath(video_path),
+            "settings": settings,
+            "chunks": plan_video(video_path, chunk_size, vad, vad_threshold, min_silence),
+            "done": 0,
+            "offset": 0,
+            "state": {"current_speaker": 1, "last_end_time": 0},
+        }
+        open(output_file, "w", encoding="utf-8").close()
+        save_checkpoint(output_file, checkpoint)
+
+    remaining = checkpoint["chunks"][checkpoint["done"]:]
+    if workers > 1 or pool is not None:
+        results = parallel_results(video_path, remaining, workers, threads, overlap, engine, pool)
+    else:
+        model = model or load_model(threads, engine)
+        results = (transcribe_range(model, video_path, start, end, overlap) for start, end in remaining)
+
+    # On utilise 'utf-8' pour éviter les caractères bizarres comme Ã©
+    with open(output_file, "a", encoding="utf-8") as f:
+        for segments in results:
+            write_segments(f, segments, checkpoint["state"])
+            checkpoint["done"] += 1
+            checkpoint["offset"] = f.tell()
+            save_checkpoint(output_file, checkpoint)
+            print(f"  morceau {checkpoint['done']}/{len(checkpoint['chunks'])} terminé")
+
+    os.remove(checkpoint_path(output_file))
+
+def transcribe_video(model, video_path, output_file, chunk_size=CHUNK_SIZE, pool=None, engine=DEFAULT_ENGINE, **options):
+    """
+    Transcription complète d'une vidéo avec un modèle déjà chargé, ou avec un pool
+    de workers déjà chargés (transcriber.py, transcribe_batch.py et main).
+    options : autres paramètres de transcribe_file (vad, overlap, workers, restart...).
+    """
+    tmp_file = output_file + ".part"
+    transcribe_file(video_path, tmp_file, chunk_size, model=model, pool=pool, engine=engine, **options)
+    # Le .txt n'apparaît qu'une fois complet : sa présence marque la vidéo comme traitée
+    os.replace(tmp_file, output_file)
+
 def main():
-    if len(sys.argv) < 2:
-        print("Usage: python Recorder.py <video_file>")
-        sys.exit(1)
+    parser = argparse.ArgumentParser(description="Transcription d'une vidéo avec alternance des locuteurs")
+    parser.add_argument("video_file")
+    parser.add_argument("--workers", type=int, default=1,
+                        help="process de transcription en parallèle (1 = séquentiel)")
+    parser.add_argument("--threads", type=int, default=None, help="threads torch par worker")
+    parser.add_argument("--engine", default=DEFAULT_ENGINE,
+                        help="moteur[:modèle[:calcul]] parmi %s (ex. faster-whisper:small:int8)" % ", ".join(ENGINES))
+    parser.add_argument("--overlap", type=int, default=5,
+                        help="recouvrement en secondes entre morceaux (mode parallèle sans VAD)")
+    parser.add_argument("--no-vad", action="store_true",
+                        help="morceaux fixes sans détection de parole (tout est transcrit)")
+    parser.add_argument("--vad-threshold", type=float, default=None,
+                        help="seuil de parole en dBFS (défaut : bruit de fond + 12 dB)")
+    parser.add_argument("--min-silence", type=float, default=2.0,
+                        help="durée minimale en secondes d'un silence qui sépare deux plages de parole")
+    parser.add_argument("--output-dir", default=None,
+                        help="dossier des transcriptions (défaut : à côté de la vidéo, où search.py les indexe)")
+    parser.add_argument("--restart", action="store_true",
+                        help="ignore le point de reprise et recommence depuis le début")
+    args = parser.parse_args()
 
-    video_path = sys.argv[1]
-    output_dir = "transcript"
+    video_path = args.video_file
+    # 'x.mp4' -> 'x.txt' comme transcriber.py et transcribe_batch.py
+    output_dir = args.output_dir or os.path.dirname(os.path.abspath(video_path))
     os.makedirs(output_dir, exist_ok=True)
 
     base_name = os.path.splitext(os.path.basename(video_path))[0]
     output_file = os.path.join(output_dir, f"{base_name}.txt")
 
-    print(f"--- Mode: CPU | Diarisation et Correction Encodage ---")
-    model = stable_whisper.load_model("small", device="cpu")
-
-    video = VideoFileClip(video_path)
-    duration = video.duration
-    chunk_size = 1200 
-    
-    # Variables pour gérer l'alternance des voix
-    current_speaker = 1
-    last_end_time = 0
+    print(f"--- Mode: CPU x{args.workers} {args.engine} | Diarisation et Correction Encodage ---")
 
-    # On utilise 'utf-8' pour éviter les caractères bizarres comme Ã©
-    with open(output_file, "w", encoding="utf-8") as f:
-        current_time = 0
-        while current_time < duration:
-            end_time = min(current_time + chunk_size, duration)
-            temp_audio = f"temp_segment_{int(current_time)}.wav"
-            
-            segment_video = video.subclipped(current_time, end_time)
-            segment_video.audio.write_audiofile(temp_audio, codec="pcm_s16le")
-
-            # Transcription avec paramètres de séparation
-            result = model.transcribe(temp_audio, language="fr", fp16=False)
-
-            for seg in result.segments:
-                start_glob_sec = seg.start + current_time
-                end_glob_sec = seg.end + current_time
-                
-                # LOGIQUE DE NUMÉROTATION :
-                # Si le silence entre deux segments est > 0.8 seconde, on change de personne.
-                # C'est ce qui permet de séparer le streamer de la série.
-                if (seg.start - last_end_time) > 0.8:
-                    current_speaker = 1 if current_speaker == 2 else 2
-                
-                start_str = format_timestamp(start_glob_sec)
-                end_str = format_timestamp(end_glob_sec)
-                text = seg.text.strip()
-                
-                # Écriture formatée avec le Locuteur
-                f.write(f"[{start_str} - {end_str}] LOCUTEUR {current_speaker} : {text}\n")
-                
-                last_end_time = seg.end
-
-            f.flush()
-            if os.path.exists(temp_audio):
-                os.remove(temp_audio)
-            current_time += chunk_size
+    # Morceaux coupés dans les silences (VAD) : pas de recouvrement, rien à dédoublonner
+    overlap = args.overlap if args.no_vad and args.workers > 1 else 0
+    # Via x.txt.part : tant qu'il manque, transcriber.py, transcribe_batch.py et search.py ignorent la vidéo
+    transcribe_video(None, video_path, output_file, CHUNK_SIZE, engine=args.engine,
+                     vad=not args.no_vad, vad_threshold=args.vad_threshold, min_silence=args.min_silence,
+                     overlap=overlap, workers=args.workers, threads=args.threads, restart=args.restart)
 
-    video.close()
     print(f"\nTerminé ! Le fichier propre est ici : {output_file}")
 
 if __name__ == "__main__":
@@ -0,0 +1,163 @@
+"""
+Catalogue des enregistrements : manifeste JSON (catalogue.json à la racine
+servie par nginx) mis à jour à chaque vidéo produite, lu une seule fois par
+index.html au lieu de scraper l'autoindex.
+
+USAGE :
+    python catalogue.py <root_path>    # complète le manifeste avec les fichiers pas encore catalogués
+"""
+
+import datetime
+import json
+import logging
+import os
+import re
+import sys
+import threading
+
+from encoding import probe_media
+
+# Fichiers de rendition secondaires : 'x.720p.mp4'
+RENDITION_RE = re.compile(r"^(?P<base>.+)\.(?P<name>[^.\s]+)\.mp4$")
+START_RE = re.compile(r"(\d{4}-\d{2}-\d{2}_\d{2}-\d{2}-\d{2})")
+
+
+def main_rendition(name, names):
+    """
+    Vidéo principale ('x.mp4') dont name est une rendition secondaire ('x.720p.mp4'),
+    si elle figure dans names ; sinon None. Noms simples ou chemins complets.
+    """
+    match = RENDITION_RE.match(name)
+    if not match:
+        return None
+    main = match.group("base") + ".mp4"
+    return main if main in names else None
+
+
+def parse_start(filename):
+    """Heure de début depuis le nom 'user - 2026-02-22_11-19-28.mp4'."""
+    match = START_RE.search(filename)
+    if not match:
+        return None
+    return datetime.datetime.strptime(match.group(1), "%Y-%m-%d_%H-%M-%S").isoformat()
+
+
+class Catalogue:
+    def __init__(self, root_path, ffprobe_path="ffprobe"):
+        self.root_path = root_path
+        self.ffprobe_path = ffprobe_path
+        self.path = os.path.join(root_path, "catalogue.json")
+        self.lock = threading.Lock()
+        self.entries = self._load()
+
+    def _load(self):
+        if not os.path.exists(self.path):
+            return {}
+        try:
+            with open(self.path, encoding="utf-8") as f:
+                return {entry["id"]: entry for entry in json.load(f)["recordings"]}
+        except (OSError, ValueError, KeyError) as e:
+            logging.error("Unreadable catalogue %s: %s", self.path, e)
+            return {}
+
+    def _save(self):
+        recordings = sorted(self.entries.values(), key=lambda e: e.get("start") or "", reverse=True)
+        tmp_path = self.path + ".tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump({"updated": datetime.datetime.now().isoformat(timespec="seconds"),
+                       "recordings": recordings}, f)
+        os.replace(tmp_path, self.path)
+
+    def url(self, path):
+        return "/" + os.path.relpath(path, self.root_path).replace(os.sep, "/")
+
+    def describe(self, name, path):
+        media = probe_media(path, self.ffprobe_path)
+        if name is None:
+            name = "%sp" % media["height"] if media["height"] else "source"
+        return {
+            "name": name,
+            "url": self.url(path),
+            "width": media["width"],
+            "height": media["height"],
+            "size": media["size"],
+            "bitrate": media["bitrate"],
+        }, media["duration"]
+
+    def add(self, outputs):
+        """outputs = [(rendition, path)], la première rendition fait office d'entrée principale."""
+        main_path = outputs[0][1]
+        renditions = []
+        duration = 0.0
+        for rendition, path in outputs:
+            try:
+                described, rendition_duration = self.describe(rendition["name"], path)
+            except Exception as e:
+                logging.error("Cannot probe %s for the catalogue: %s", path, e)
+                continue
+            renditions.append(described)
+            duration = max(duration, rendition_duration)
+        if not renditions:
+            return None
+
+        channel = os.path.basename(os.path.dirname(main_path))
+        base = os.path.splitext(main_path)[0]
+        entry = {
+            "id": self.url(main_path),
+            "channel": channel,
+            "title": os.path.splitext(os.path.basename(main_path))[0],
+            "start": parse_start(os.path.basename(main_path)),
+            "duration": duration,
+            "size": sum(r["size"] for r in renditions),
+            "renditions": renditions,
+        }
+        # Prévisualisations et HLS produits à la compression (encoding.build_previews / package_hls)
+        for key, suffix in (("poster", ".poster.jpg"), ("thumbnails", ".thumbs.vtt"), ("hls", ".hls/master.m3u8")):
+            if os.path.exists(base + suffix):
+                entry[key] = self.url(base + suffix)
+        with self.lock:
+            self.entries[entry["id"]] = entry
+            self._save()
+        return entry
+
+    def remove(self, path):
+        """Retire l'entrée (ou la rendition) correspondant à un fichier supprimé."""
+        url = self.url(path)
+        with self.lock:
+            if url in self.entries:
+                del self.entries[url]
+            else:
+                for entry in self.entries.values():
+                    entry["renditions"] = [r for r in entry["renditions"] if r["url"] != url]
+            self._save()
+
+    def rebuild(self):
+        """Parcours complet de processed/ : ne sonde que les fichiers absents du manifeste."""
+        processed_root = os.path.join(self.root_path, "processed")
+        known = {r["url"] for entry in self.entries.values() for r in entry["renditions"]}
+        for channel in sorted(os.listdir(processed_root)):
+            channel_path = os.path.join(processed_root, channel)
+            if not os.path.isdir(channel_path):
+                continue
+            names = sorted(n for n in os.listdir(channel_path) if n.endswith(".mp4"))
+            groups = {}
+            for name in names:
+                main = main_rendition(name, names)
+                if main:
+                    groups.setdefault(main, []).append((RENDITION_RE.match(name).group("name"), name))
+                else:
+                    groups.setdefault(name, [])
+            for main, extra in groups.items():
+                paths = [(None, main)] + extra
+                if all(self.url(os.path.join(channel_path, n)) in known for _, n in paths):
+                    continue
+                logging.info("Cataloguing %s", main)
+                self.add([({"name": label}, os.path.join(channel_path, n)) for label, n in paths])
+
+
+if __name__ == "__main__":
+    if len(sys.argv) < 2:
+        print("Usage: python catalogue.py <root_path>")
+        sys.exit(1)
+    logging.basicConfig(level=logging.INFO, format='%(message)s')
+    Catalogue(sys.argv[1]).rebuild()
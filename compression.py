@@ -0,0 +1,101 @@
+import json
+import logging
+import os
+import queue
+import threading
+
+
+class CompressionQueue:
+    """
+    File bornée de jobs de compression servie par un pool de workers.
+    Chaque worker pilote un process ffmpeg ; la concurrence est plafonnée
+    au nombre de CPU. Les jobs sont journalisés sur disque pour survivre
+    à un redémarrage.
+    """
+
+    def __init__(self, compress, journal_path, workers=None, maxsize=64):
+        cpu_count = os.cpu_count() or 1
+        self.compress = compress
+        self.journal_path = journal_path
+        self.workers = max(1, min(workers or cpu_count, cpu_count))
+        self.queue = queue.Queue(maxsize=maxsize)
+        self.lock = threading.Lock()
+        self.jobs = self._load_journal()
+        self.threads = []
+
+    def _load_journal(self):
+        if not os.path.exists(self.journal_path):
+            return []
+        try:
+            with open(self.journal_path, encoding="utf-8") as f:
+                return json.load(f)
+        except (OSError, ValueError) as e:
+            logging.error("Unreadable compression journal %s: %s", self.journal_path, e)
+            return []
+
+    def _save_journal(self):
+        # Écriture atomique : un crash ne laisse jamais un journal tronqué
+        tmp_path = self.journal_path + ".tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump(self.jobs, f, indent=2)
+        os.replace(tmp_path, self.journal_path)
+
+    def start(self):
+        for i in range(self.workers):
+            thread = threading.Thread(target=self._worker, name="compress-%d" % i, daemon=True)
+            thread.start()
+            self.threads.append(thread)
+        logging.info("Compression pool started with %s workers", self.workers)
+
+    def depth(self):
+        return self.queue.qsize()
+
+    def submit(self, input_file, output_file):
+        job = {"input": input_file, "output": output_file}
+        with self.lock:
+            if job not in self.jobs:
+                self.jobs.append(job)
+                self._save_journal()
+        self.queue.put(job)
+        logging.info("Queued compression of %s (%s pending)", input_file, self.depth())
+
+    def recover(self, channels):
+        """
+        Réinjecte les jobs du journal puis les fichiers orphelins de
+        recorded/ (crash avant la mise en file). channels = [(recorded_path, processed_path)].
+        Un original dont la version compressée existe déjà est conservé
+        volontairement (tee du mode live_transcode) et n'est pas repris.
+        """
+        with self.lock:
+            pending = [job for job in self.jobs if os.path.exists(job["input"])]
+            self.jobs = list(pending)
+            self._save_journal()
+        known = {job["input"] for job in pending}
+
+        for recorded_path, processed_path in channels:
+            if not os.path.isdir(recorded_path):
+                continue
+            for name in sorted(os.listdir(recorded_path)):
+                path = os.path.join(recorded_path, name)
+                output = os.path.join(processed_path, name)
+                if name.endswith(".mp4") and path not in known and not os.path.exists(output):
+                    pending.append({"input": path, "output": output})
+
+        for job in pending:
+            logging.info("Recovering unprocessed recording %s", job["input"])
+            self.submit(job["input"], job["output"])
+
+    def _worker(self):
+        while True:
+            job = self.queue.get()
+            try:
+                self.compress(job["input"], job["output"])
+            except Exception as e:
+                logging.error("Compression job %s failed: %s", job["input"], e)
+            finally:
+                # Un échec laisse l'original en place : il sera repris au prochain démarrage
+                with self.lock:
+                    if job in self.jobs:
+                        self.jobs.remove(job)
+                        self._save_journal()
+                self.queue.task_done()
@@ -17,8 +17,14 @@ import matplotlib.pyplot as plt
 import matplotlib.colors as mcolors
 from datetime import datetime, timedelta, timezone
 import json
+import multiprocessing
 import os
+import queue
+import re
+import shutil
+import subprocess
 import sys
+import threading
 
 try:
     from pysolar.solar import get_altitude, get_azimuth
@@ -56,10 +62,28 @@ VIDEO_SOURCES = [
         ],
         # Pas d'échantillonnage en secondes (5 = précis, 30 = rapide)
         "step": 10,
+        # Optionnel : "sequential", "ffmpeg" ou "auto" (défaut : EXTRACTION_STRATEGY)
+        # "strategy": "ffmpeg",
     },
     # Tu peux ajouter d'autres vidéos ici avec d'autres ROI
 ]
 
+# --- DÉCODAGE ---
+# "sequential" : décodage continu OpenCV, grab() pour passer les images entre deux samples
+# "ffmpeg"     : ffmpeg ne décode que les images-clés et ne renvoie que les pixels de la ROI ;
+#                chaque sample est la première image-clé à partir de l'instant visé
+# "auto"       : "ffmpeg" si step >= KEYFRAME_RATIO x l'espacement des images-clés et si
+#                PARITY_SAMPLES samples des deux lecteurs concordent, sinon "sequential"
+EXTRACTION_STRATEGY = "auto"
+KEYFRAME_RATIO = 4
+PARITY_SAMPLES = 5
+# Écart max de luminosité moyenne (niveaux de gris 0-255) entre les deux lecteurs
+PARITY_TOLERANCE = 4.0
+# Process d'extraction en parallèle (None = nombre de CPU, 1 = sans pool)
+EXTRACTION_WORKERS = None
+# Les segments plus longs sont découpés en plages de cette durée (s) pour répartir la charge
+EXTRACTION_SPLIT = 900
+
 # --- IMAGE SATELLITE ---
 SATELLITE_IMAGE = "village.png"   # Ton image satellite de Verjux
 # Coordonnées GPS des coins de l'image satellite (TL = top-left, BR = bottom-right)
@@ -88,52 +112,255 @@ def to_sec(t_str):
     return h * 3600 + m * 60 + s
 
 
-def extract_brightness(source: dict) -> list:
+def keyframe_interval(file: str, at: float, window: int = 60):
+    """Espacement moyen (s) des images-clés sur `window` secondes à partir de `at`, via ffprobe."""
+    try:
+        output = subprocess.check_output([
+            "ffprobe", "-v", "error", "-select_streams", "v:0",
+            "-skip_frame", "nokey",
+            "-show_entries", "frame=best_effort_timestamp_time",
+            "-of", "csv=p=0",
+            "-read_intervals", f"{at}%+{window}",
+            file
+        ], text=True)
+    except (OSError, subprocess.CalledProcessError):
+        return None
+    times = sorted(float(line.strip(",")) for line in output.split() if line.strip(",") not in ("", "N/A"))
+    if len(times) < 2:
+        return None
+    return (times[-1] - times[0]) / (len(times) - 1)
+
+
+def choose_strategy(file: str, roi: tuple, at: float, step: float) -> str:
     """
-    Extrait mean/std/variation par step secondes sur les segments demandés.
-    Retourne une liste de dicts avec 'dt' (datetime UTC), 'mean', 'std', 'variation'.
+    Pas dense (quelques images-clés entre deux samples ou moins) : chaque image
+    doit de toute façon être décodée → décodage séquentiel, sans aucun seek.
+    Pas creux : ffmpeg ne décode que les images-clés (chaque sample est pris
+    jusqu'à un espacement après l'instant visé, donc < step / KEYFRAME_RATIO),
+    à condition que check_ffmpeg_parity le confirme sur cette vidéo.
     """
-    results = []
+    if not shutil.which("ffmpeg") or not shutil.which("ffprobe"):
+        return "sequential"
+    interval = keyframe_interval(file, at)
+    if interval is None:
+        return "sequential"
+    strategy = "ffmpeg" if step >= KEYFRAME_RATIO * interval else "sequential"
+    if strategy == "ffmpeg" and not check_ffmpeg_parity(file, roi, at, step):
+        strategy = "sequential"
+    print(f"  images-clés toutes les {interval:.1f}s, step={step}s → {strategy}")
+    return strategy
+
+
+def check_ffmpeg_parity(file: str, roi: tuple, at: float, step: float,
+                        samples: int = PARITY_SAMPLES) -> bool:
+    """
+    Lit `samples` samples à partir de `at` avec les deux lecteurs : mêmes instants
+    et luminosité moyenne à PARITY_TOLERANCE près, sinon ffmpeg n'est pas utilisé.
+    """
+    limit = at + (samples - 1) * step
+    sequential = [(curr, float(np.mean(blurred_gray(pixels))))
+                  for curr, pixels in read_rois_sequential(file, roi, at, limit, step)]
+    keyframes = [(curr, float(np.mean(blurred_gray(pixels))))
+                 for curr, pixels in read_rois_ffmpeg(file, roi, at, limit, step)]
+
+    if [curr for curr, _ in sequential] != [curr for curr, _ in keyframes]:
+        print(f"  [WARN] parité ffmpeg : {len(keyframes)} samples au lieu de {len(sequential)}")
+        return False
+    gap = max((abs(a - b) for (_, a), (_, b) in zip(sequential, keyframes)), default=0.0)
+    if gap > PARITY_TOLERANCE:
+        print(f"  [WARN] parité ffmpeg : écart de luminosité {gap:.1f} > {PARITY_TOLERANCE}")
+        return False
+    return True
+
+
+def read_rois_sequential(file: str, roi: tuple, start: float, limit: float, step: float):
+    """
+    Un seul seek par plage [start, limit], puis décodage continu : grab() décode sans
+    convertir en BGR, seule l'image de chaque sample est récupérée.
+    Produit des tuples (secondes vidéo, ROI BGR).
+    """
+    roi_y, roi_x, roi_h, roi_w = roi
+    cap = cv2.VideoCapture(file)
+    if not cap.isOpened():
+        print(f"[ERR] Impossible d'ouvrir : {file}")
+        return
+
+    # Tolérance d'une demi-image sur le timestamp visé
+    tolerance = 500.0 / (cap.get(cv2.CAP_PROP_FPS) or 30.0)
+    curr = start
+    try:
+        cap.set(cv2.CAP_PROP_POS_MSEC, curr * 1000)
+        ret, frame = cap.read()
+
+        while ret and curr <= limit:
+            yield curr, frame[roi_y:roi_y+roi_h, roi_x:roi_x+roi_w]
+            curr += step
+            if curr > limit:
+                break
+            ret = False
+            while cap.grab():
+                if cap.get(cv2.CAP_PROP_POS_MSEC) >= curr * 1000 - tolerance:
+                    ret, frame = cap.retrieve()
+                    break
+    finally:
+        cap.release()
+
+
+# Ligne du filtre showinfo : '... n:   3 pts:  90000 pts_time:3 ...'
+SHOWINFO_RE = re.compile(rb"pts_time:\s*(-?[0-9.]+)")
+
+
+def _read_frame_times(stream, times: queue.Queue):
+    # showinfo journalise chaque image avant qu'elle n'arrive sur stdout
+    for line in stream:
+        match = SHOWINFO_RE.search(line)
+        if match:
+            times.put(float(match.group(1)))
+    times.put(None)
+
+
+def read_rois_ffmpeg(file: str, roi: tuple, start: float, limit: float, step: float):
+    """
+    ffmpeg décode seulement les images-clés (-skip_frame nokey) et crop ne laisse
+    que la ROI : le pipe ne transporte que roi_h x roi_w x 3 octets par image-clé
+    (bgr24, même conversion en gris qu'avec OpenCV). showinfo donne l'instant de
+    chaque image ; chaque sample est la première image-clé à partir de l'instant
+    visé (retard dans [0, espacement des images-clés[), y compris celui de limit.
+    Produit des tuples (secondes vidéo, ROI BGR).
+    """
+    roi_y, roi_x, roi_h, roi_w = roi
+    frame_bytes = roi_h * roi_w * 3
+    targets = [start + i * step for i in range(int((limit - start) / step + 1e-9) + 1)]
+    # Tolérance d'une demi-image (30 ips) sur le timestamp visé, comme le lecteur séquentiel
+    tolerance = 0.5 / 30
+
+    # Sans -t : la lecture s'arrête à la première image-clé après le dernier sample
+    process = subprocess.Popen([
+        "ffmpeg", "-nostdin", "-hide_banner", "-nostats", "-loglevel", "info",
+        "-skip_frame", "nokey",
+        "-ss", str(start),
+        "-i", file,
+        "-an",
+        "-vf", f"crop={roi_w}:{roi_h}:{roi_x}:{roi_y},showinfo",
+        # Une image en sortie par image-clé décodée : pas de duplication à cadence fixe
+        "-fps_mode", "passthrough",
+        "-pix_fmt", "bgr24", "-f", "rawvideo", "-"
+    ], stdout=subprocess.PIPE, stderr=subprocess.PIPE)
+    times = queue.Queue()
+    reader = threading.Thread(target=_read_frame_times, args=(process.stderr, times), daemon=True)
+    reader.start()
+
+    index = 0
+    try:
+        while index < len(targets):
+            data = process.stdout.read(frame_bytes)
+            if len(data) < frame_bytes:
+                break
+            pts_time = times.get()
+            if pts_time is None:
+                break
+            # -ss en entrée : les timestamps partent de start
+            curr = start + pts_time
+            pixels = np.frombuffer(data, dtype=np.uint8).reshape(roi_h, roi_w, 3)
+            while index < len(targets) and curr >= targets[index] - tolerance:
+                yield targets[index], pixels
+                index += 1
+    finally:
+        if process.poll() is None:
+            # Images-clés suivantes inutiles (ou lecture abandonnée)
+            process.kill()
+        elif process.returncode != 0:
+            print(f"[WARN] ffmpeg a quitté avec le code {process.returncode} ({start}-{limit}s)")
+        process.stdout.close()
+        process.wait()
+        reader.join()
+        process.stderr.close()
+
+
+def split_range(start: float, limit: float, step: float) -> list:
+    """
+    Découpe [start, limit] en plages d'au plus EXTRACTION_SPLIT secondes, alignées
+    sur step : les instants échantillonnés sont exactement ceux d'un seul passage.
+    """
+    per_range = max(1, int(EXTRACTION_SPLIT // step))
+    ranges = []
+    curr = start
+    while curr <= limit:
+        ranges.append((curr, min(curr + (per_range - 1) * step, limit)))
+        curr += per_range * step
+    return ranges
+
+
+def extraction_tasks(source: dict) -> list:
+    """Plages indépendantes d'une source, dans l'ordre chronologique : (file, roi, start, limit, step, strategy)."""
     file = source["file"]
-    roi_y, roi_x, roi_h, roi_w = source["roi"]
-    real_start = source["real_start"]
     step = source["step"]
-
     if not os.path.exists(file):
         print(f"[WARN] Vidéo introuvable : {file} — segment ignoré")
-        return results
-
-    cap = cv2.VideoCapture(file)
-    if not cap.isOpened():
-        print(f"[ERR] Impossible d'ouvrir : {file}")
-        return results
+        return []
 
+    segments = sorted((to_sec(seg_start), to_sec(seg_end)) for seg_start, seg_end in source["segments"])
+    if not segments:
+        return []
     print(f"\n[VIDEO] {file}")
-    prev_gray = None
+    strategy = source.get("strategy", EXTRACTION_STRATEGY)
+    if strategy == "auto":
+        strategy = choose_strategy(file, source["roi"], segments[0][0], step)
 
-    for seg_start, seg_end in source["segments"]:
-        curr = to_sec(seg_start)
-        limit = to_sec(seg_end)
-        cap.set(cv2.CAP_PROP_POS_MSEC, curr * 1000)
+    return [
+        (file, source["roi"], start, limit, step, strategy)
+        for seg_start, seg_end in segments
+        for start, limit in split_range(seg_start, seg_end, step)
+    ]
 
-        while curr <= limit:
-            ret, frame = cap.read()
-            if not ret:
-                break
 
-            roi = frame[roi_y:roi_y+roi_h, roi_x:roi_x+roi_w]
-            gray = cv2.cvtColor(roi, cv2.COLOR_BGR2GRAY)
-            # Léger flou pour réduire le bruit capteur
-            gray = cv2.GaussianBlur(gray, (5, 5), 0)
+def blurred_gray(roi: np.ndarray) -> np.ndarray:
+    gray = cv2.cvtColor(roi, cv2.COLOR_BGR2GRAY)
+    # Léger flou pour réduire le bruit capteur
+    return cv2.GaussianBlur(gray, (5, 5), 0)
+
+
+def extract_range(task: tuple) -> dict:
+    """
+    Exécuté par un worker : une capture (ou un process ffmpeg) pour une seule plage.
+    La variation du premier sample dépend de la plage précédente : le worker
+    renvoie aussi ses ROI de bord pour que le parent la calcule à la fusion.
+    """
+    file, roi, start, limit, step, strategy = task
+    reader = read_rois_ffmpeg if strategy == "ffmpeg" else read_rois_sequential
+
+    samples = []
+    first_gray = prev_gray = None
+    for curr, pixels in reader(file, roi, start, limit, step):
+        gray = blurred_gray(pixels)
+        if first_gray is None:
+            first_gray = gray
+        if prev_gray is not None and prev_gray.shape == gray.shape:
+            variation = float(np.mean(cv2.absdiff(prev_gray, gray)))
+        else:
+            variation = 0.0
+        prev_gray = gray
+
+        samples.append((curr, float(np.mean(gray)), float(np.std(gray)), variation))
+
+    return {"samples": samples, "first_gray": first_gray, "last_gray": prev_gray}
+
 
-            mean_val = float(np.mean(gray))
-            std_val  = float(np.std(gray))
+def merge_ranges(source: dict, ranges: list) -> list:
+    """
+    Fusionne les plages d'une source dans l'ordre chronologique. Comme en
+    extraction séquentielle, le premier sample d'une plage est comparé au dernier
+    sample de la plage précédente de la même vidéo.
+    """
+    results = []
+    real_start = source["real_start"]
+    prev_gray = None
 
-            if prev_gray is not None and prev_gray.shape == gray.shape:
-                variation = float(np.mean(cv2.absdiff(prev_gray, gray)))
-            else:
-                variation = 0.0
-            prev_gray = gray.copy()
+    for extracted in ranges:
+        first_gray = extracted["first_gray"]
+        for i, (curr, mean_val, std_val, variation) in enumerate(extracted["samples"]):
+            if i == 0 and prev_gray is not None and prev_gray.shape == first_gray.shape:
+                variation = float(np.mean(cv2.absdiff(prev_gray, first_gray)))
 
             real_dt = real_start + timedelta(seconds=curr)
 
@@ -147,26 +374,49 @@ def extract_brightness(source: dict) -> list:
             print(f"  {real_dt.strftime('%H:%M:%S')} | mean={mean_val:6.1f} "
                   f"std={std_val:5.1f} var={variation:5.1f}")
 
-            curr += step
-            cap.set(cv2.CAP_PROP_POS_MSEC, curr * 1000)
+        if extracted["last_gray"] is not None:
+            prev_gray = extracted["last_gray"]
 
-    cap.release()
     return results
 
 
+def extract_brightness(source: dict) -> list:
+    """
+    Extrait mean/std/variation par step secondes sur les segments demandés.
+    Retourne une liste de dicts avec 'dt' (datetime UTC), 'mean', 'std', 'variation'.
+    """
+    tasks = extraction_tasks(source)
+    return merge_ranges(source, [extract_range(task) for task in tasks])
+
+
 def load_or_extract_data() -> list:
     """
     Si brightness_data.json existe → on recharge (gain de temps).
     Sinon → on extrait depuis les vidéos et on sauvegarde.
+    Toutes les plages de toutes les vidéos sont réparties sur un pool de process.
     """
     if os.path.exists(OUTPUT_DATA):
         print(f"[INFO] Chargement données existantes : {OUTPUT_DATA}")
         with open(OUTPUT_DATA) as f:
             return json.load(f)
 
+    sources = [(source, extraction_tasks(source)) for source in VIDEO_SOURCES]
+    tasks = [task for _, source_tasks in sources for task in source_tasks]
+    workers = min(EXTRACTION_WORKERS or os.cpu_count() or 1, max(len(tasks), 1))
+
+    print(f"\n[EXTRACTION] {len(tasks)} plages sur {workers} process")
+    if workers > 1:
+        with multiprocessing.Pool(workers) as pool:
+            # map rend les résultats dans l'ordre des tâches, quel que soit l'ordre de fin
+            extracted = pool.map(extract_range, tasks, chunksize=1)
+    else:
+        extracted = [extract_range(task) for task in tasks]
+
     all_data = []
-    for source in VIDEO_SOURCES:
-        all_data.extend(extract_brightness(source))
+    offset = 0
+    for source, source_tasks in sources:
+        all_data.extend(merge_ranges(source, extracted[offset:offset + len(source_tasks)]))
+        offset += len(source_tasks)
 
     if not all_data:
         print("[ERR] Aucune donnée extraite. Vérifie tes fichiers vidéo.")
@@ -0,0 +1,156 @@
+"""
+Benchmark des réglages d'encodage de compress_video : fps, taille de sortie
+et qualité (SSIM / PSNR mesurés par ffmpeg) par preset et CRF.
+
+USAGE :
+    python encoder_bench.py [clip.mp4 ...] [--synthetic 2] [--duration 30]
+                            [--presets veryfast,fast,medium] [--crfs 26,30]
+                            [--output encoder_bench.json]
+
+Sans clip, des clips de test sont générés localement (testsrc2 + bruit).
+Le JSON produit peut servir de politique : auto_preset = "encoder_bench.json"
+dans config.py.
+"""
+
+import argparse
+import json
+import os
+import re
+import subprocess
+import tempfile
+import time
+
+from encoding import DEFAULT_RENDITIONS, X264_PRESETS, PresetPolicy, ladder_args, probe_duration
+
+SSIM_RE = re.compile(r"SSIM .*All:([\d.]+)")
+PSNR_RE = re.compile(r"PSNR .*average:([\d.inf]+)")
+
+
+def generate_clip(path, duration, seed, ffmpeg_path="ffmpeg"):
+    """Clip synthétique 720p30 : mire animée + bruit temporel pour que l'encodeur ait du travail."""
+    subprocess.check_call([
+        ffmpeg_path, "-y", "-loglevel", "error",
+        "-f", "lavfi", "-i", "testsrc2=size=1280x720:rate=30:duration=%d" % duration,
+        "-f", "lavfi", "-i", "sine=frequency=%d:duration=%d" % (220 + 110 * seed, duration),
+        "-vf", "noise=alls=%d:allf=t+u" % (8 + 4 * seed),
+        "-c:v", "libx264", "-preset", "ultrafast", "-crf", "12",
+        "-c:a", "aac",
+        path
+    ])
+    return path
+
+
+def probe_frames(path, ffprobe_path="ffprobe"):
+    """Nombre d'images de la piste vidéo (paquets lus, sans décodage)."""
+    output = subprocess.check_output([
+        ffprobe_path, "-v", "error", "-select_streams", "v:0",
+        "-count_packets", "-show_entries", "stream=nb_read_packets",
+        "-of", "default=noprint_wrappers=1:nokey=1",
+        path
+    ])
+    return int(output.decode().strip())
+
+
+def measure_quality(encoded, reference, height, ffmpeg_path="ffmpeg"):
+    # La référence est ramenée à la hauteur de l'encodage pour une comparaison pixel à pixel
+    result = subprocess.run([
+        ffmpeg_path, "-i", encoded, "-i", reference,
+        "-lavfi",
+        "[1:v]scale=-2:%d,split[r1][r2];[0:v]split[e1][e2];[e1][r1]ssim;[e2][r2]psnr" % height,
+        "-f", "null", "-"
+    ], capture_output=True, text=True)
+    ssim = SSIM_RE.search(result.stderr)
+    psnr = PSNR_RE.search(result.stderr)
+    return (
+        float(ssim.group(1)) if ssim else 0.0,
+        float(psnr.group(1)) if psnr else 0.0,
+    )
+
+
+def bench_clip(clip, presets, crfs, work_dir, ffmpeg_path="ffmpeg"):
+    results = []
+    duration = probe_duration(clip)
+    frames = probe_frames(clip)
+    base = DEFAULT_RENDITIONS[0]
+    for preset in presets:
+        for crf in crfs:
+            rendition = dict(base, preset=preset, crf=crf)
+            output = os.path.join(work_dir, "bench_%s_%s.mp4" % (preset, crf))
+            start = time.perf_counter()
+            subprocess.check_call(
+                [ffmpeg_path, "-y", "-loglevel", "error", "-i", clip] +
+                ladder_args([(rendition, output)])
+            )
+            elapsed = time.perf_counter() - start
+            ssim, psnr = measure_quality(output, clip, rendition["height"], ffmpeg_path)
+            result = {
+                "clip": os.path.basename(clip),
+                "preset": preset,
+                "crf": crf,
+                "fps": frames / elapsed,
+                "speed": duration / elapsed,
+                "size": os.path.getsize(output),
+                "ssim": ssim,
+                "psnr": psnr,
+            }
+            print("%-24s %-10s crf=%-3s %7.1f fps  %5.2fx  %8.1f kB  SSIM=%.4f  PSNR=%.2f" % (
+                result["clip"][:24], preset, crf, result["fps"], result["speed"],
+                result["size"] / 1000, ssim, psnr))
+            results.append(result)
+            os.remove(output)
+    return results
+
+
+def summarize(results):
+    """Moyenne par (preset, crf) sur tous les clips, format attendu par PresetPolicy.from_benchmark."""
+    groups = {}
+    for r in results:
+        groups.setdefault((r["preset"], r["crf"]), []).append(r)
+    return [
+        {
+            "preset": preset,
+            "crf": crf,
+            "fps": sum(r["fps"] for r in rs) / len(rs),
+            "size": sum(r["size"] for r in rs) / len(rs),
+            "ssim": sum(r["ssim"] for r in rs) / len(rs),
+            "psnr": sum(r["psnr"] for r in rs) / len(rs),
+        }
+        for (preset, crf), rs in groups.items()
+    ]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("clips", nargs="*")
+    parser.add_argument("--synthetic", type=int, default=2, help="clips générés si aucun clip n'est donné")
+    parser.add_argument("--duration", type=int, default=30)
+    parser.add_argument("--presets", default="ultrafast,superfast,veryfast,faster,fast,medium")
+    parser.add_argument("--crfs", default="26,30")
+    parser.add_argument("--min-ssim", type=float, default=0.95)
+    parser.add_argument("--output", default="encoder_bench.json")
+    args = parser.parse_args()
+
+    presets = args.presets.split(",")
+    crfs = [int(crf) for crf in args.crfs.split(",")]
+
+    with tempfile.TemporaryDirectory() as work_dir:
+        clips = args.clips or [
+            generate_clip(os.path.join(work_dir, "synthetic_%d.mp4" % i), args.duration, i)
+            for i in range(args.synthetic)
+        ]
+        results = []
+        for clip in clips:
+            results += bench_clip(clip, presets, crfs, work_dir)
+
+    summary = summarize(results)
+    policy = PresetPolicy.from_benchmark(summary, args.min_ssim, crf=DEFAULT_RENDITIONS[0]["crf"])
+    with open(args.output, "w", encoding="utf-8") as f:
+        json.dump({"results": results, "summary": summary, "min_ssim": args.min_ssim}, f, indent=2)
+
+    print("\nPolitique : file vide -> %s, file chargée -> %s" % (
+        X264_PRESETS[policy.idle], X264_PRESETS[policy.busy]))
+    print("Résultats : %s" % args.output)
+
+
+if __name__ == "__main__":
+    main()
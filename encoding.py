@@ -0,0 +1,274 @@
+import json
+import os
+import shutil
+import subprocess
+from urllib.parse import quote
+
+# Échelle de renditions par défaut : identique à l'ancien encodage 480p codé en dur
+DEFAULT_RENDITIONS = [
+    {"name": "480p", "height": 480, "crf": 30, "preset": "veryfast", "audio_bitrate": "64k", "level": "3.1"},
+]
+
+# Vignettes de prévisualisation : une toutes les THUMBNAIL_INTERVAL secondes
+THUMBNAIL_INTERVAL = 10
+THUMBNAIL_SIZE = (320, 180)
+SPRITE_TILE = (160, 90)
+SPRITE_GRID = (10, 10)
+
+
+def rendition_path(path, rendition, index):
+    """La première rendition garde le nom d'origine, les suivantes sont suffixées : 'x.720p.mp4'."""
+    if index == 0:
+        return path
+    base, ext = os.path.splitext(path)
+    return base + "." + rendition["name"] + ext
+
+
+def rendition_outputs(renditions, path):
+    return [(rendition, rendition_path(path, rendition, i)) for i, rendition in enumerate(renditions)]
+
+
+def ladder_args(outputs, faststart=True, container=None, thumbnails=None):
+    """
+    Arguments ffmpeg produisant toutes les renditions depuis un seul décodage :
+    split du flux vidéo puis un scale par sortie. outputs = [(rendition, path)].
+    thumbnails : motif image2 ('.../thumb_%04d.jpg') recevant une vignette toutes
+    les THUMBNAIL_INTERVAL secondes, prise dans le même décodage.
+    """
+    branches = [
+        "scale=-2:%d[v%d]" % (rendition["height"], i)
+        for i, (rendition, _) in enumerate(outputs)
+    ]
+    if thumbnails:
+        branches.append("fps=1/%d,scale=%d:%d[th]" % ((THUMBNAIL_INTERVAL,) + THUMBNAIL_SIZE))
+
+    if len(branches) == 1:
+        graph = "[0:v]" + branches[0]
+    else:
+        graph = "[0:v]split=%d%s;" % (len(branches), "".join("[s%d]" % i for i in range(len(branches))))
+        graph += ";".join("[s%d]%s" % (i, branch) for i, branch in enumerate(branches))
+
+    args = ["-filter_complex", graph]
+    for i, (rendition, path) in enumerate(outputs):
+        args += [
+            "-map", "[v%d]" % i,
+            "-map", "0:a?",
+            "-c:v", "libx264",
+            "-preset", rendition["preset"],
+            "-crf", str(rendition["crf"]),
+            "-profile:v", "high",
+        ]
+        if rendition.get("level"):
+            args += ["-level", rendition["level"]]
+        args += [
+            "-pix_fmt", "yuv420p",
+            "-c:a", "aac",
+            "-b:a", rendition["audio_bitrate"],
+        ]
+        if faststart:
+            args += ["-movflags", "+faststart"]
+        if container:
+            args += ["-f", container]
+        args.append(path)
+
+    if thumbnails:
+        args += ["-map", "[th]", "-q:v", "4", "-f", "image2", thumbnails]
+    return args
+
+
+def build_previews(chunks, output_file, ffmpeg_path="ffmpeg"):
+    """
+    À partir des vignettes produites pendant l'encodage : poster
+    (<base>.poster.jpg), planches de sprites (<base>.sprite-001.jpg...) et
+    index WebVTT (<base>.thumbs.vtt) pour la prévisualisation au survol.
+    Seules de petites images sont relues, jamais la vidéo.
+    chunks = [(début du morceau en secondes, vignettes du morceau)] : le filtre
+    fps de chaque morceau repart de 0, chaque vignette est donc datée depuis
+    le début de son morceau.
+    """
+    cues = [
+        (offset + i * THUMBNAIL_INTERVAL, thumb)
+        for offset, files in chunks
+        for i, thumb in enumerate(files)
+    ]
+    if not cues:
+        return None
+    thumb_files = [thumb for _, thumb in cues]
+    base = os.path.splitext(output_file)[0]
+    poster = base + ".poster.jpg"
+    # Le poster est pris à 10 % de la vidéo pour éviter l'écran de démarrage
+    shutil.copyfile(thumb_files[len(thumb_files) // 10], poster)
+
+    list_file = base + ".thumbs.txt"
+    with open(list_file, "w", encoding="utf-8") as f:
+        for thumb in thumb_files:
+            f.write("file '%s'\n" % thumb.replace("'", "'\\''"))
+    tile_w, tile_h = SPRITE_TILE
+    cols, rows = SPRITE_GRID
+    return_code = subprocess.call([
+        ffmpeg_path, "-y", "-loglevel", "error",
+        "-f", "concat", "-safe", "0", "-i", list_file,
+        "-vf", "scale=%d:%d,tile=%dx%d" % (tile_w, tile_h, cols, rows),
+        "-q:v", "5",
+        base + ".sprite-%03d.jpg"
+    ])
+    os.remove(list_file)
+    if return_code != 0:
+        return {"poster": poster}
+
+    per_sheet = cols * rows
+    vtt = base + ".thumbs.vtt"
+    with open(vtt, "w", encoding="utf-8") as f:
+        f.write("WEBVTT\n")
+        for i, (start, _) in enumerate(cues):
+            sheet, cell = divmod(i, per_sheet)
+            row, col = divmod(cell, cols)
+            sprite = quote(os.path.basename(base) + ".sprite-%03d.jpg" % (sheet + 1))
+            # Dernière vignette d'un morceau : elle s'arrête au début du suivant
+            end = start + THUMBNAIL_INTERVAL
+            if i + 1 < len(cues):
+                end = min(end, cues[i + 1][0])
+            f.write("\n%s --> %s\n%s#xywh=%d,%d,%d,%d\n" % (
+                vtt_timestamp(start),
+                vtt_timestamp(end),
+                sprite, col * tile_w, row * tile_h, tile_w, tile_h,
+            ))
+    return {"poster": poster, "vtt": vtt}
+
+
+def vtt_timestamp(seconds):
+    # Millisecondes conservées : les morceaux commencent rarement sur une seconde ronde
+    h, rest = divmod(int(round(seconds * 1000)), 3600000)
+    m, rest = divmod(rest, 60000)
+    s, ms = divmod(rest, 1000)
+    return "%02d:%02d:%02d.%03d" % (h, m, s, ms)
+
+
+def probe_duration(path, ffprobe_path="ffprobe"):
+    """Durée en secondes lue par ffprobe ; lève une exception si le fichier est illisible."""
+    output = subprocess.check_output([
+        ffprobe_path, "-v", "error",
+        "-show_entries", "format=duration",
+        "-of", "default=noprint_wrappers=1:nokey=1",
+        path
+    ])
+    return float(output.decode().strip())
+
+
+def probe_media(path, ffprobe_path="ffprobe"):
+    """Durée, taille et dimensions vidéo d'un fichier via ffprobe."""
+    output = subprocess.check_output([
+        ffprobe_path, "-v", "error",
+        "-show_entries", "format=duration,size,bit_rate:stream=codec_type,width,height",
+        "-of", "json",
+        path
+    ])
+    info = json.loads(output)
+    video = next((s for s in info.get("streams", []) if s.get("codec_type") == "video"), {})
+    fmt = info.get("format", {})
+    return {
+        "duration": float(fmt.get("duration", 0)),
+        "size": int(fmt.get("size", 0)),
+        "bitrate": int(fmt.get("bit_rate", 0)),
+        "width": video.get("width"),
+        "height": video.get("height"),
+    }
+
+
+def package_hls(outputs, ffmpeg_path="ffmpeg", ffprobe_path="ffprobe", segment_time=6):
+    """
+    Empaquetage HLS sans réencodage (segments fMP4 + playlists) dans
+    <base>.hls/ à côté du mp4 principal : une playlist par rendition et un
+    master.m3u8. Écrit dans un dossier temporaire puis renommé.
+    """
+    base = os.path.splitext(outputs[0][1])[0]
+    hls_dir = base + ".hls"
+    tmp_dir = hls_dir + ".tmp"
+    shutil.rmtree(tmp_dir, ignore_errors=True)
+    os.makedirs(tmp_dir)
+
+    variants = []
+    for rendition, path in outputs:
+        rendition_dir = os.path.join(tmp_dir, rendition["name"])
+        os.makedirs(rendition_dir)
+        return_code = subprocess.call([
+            ffmpeg_path, "-y", "-loglevel", "error",
+            "-i", path,
+            "-c", "copy",
+            "-f", "hls",
+            "-hls_time", str(segment_time),
+            "-hls_playlist_type", "vod",
+            "-hls_segment_type", "fmp4",
+            "-hls_fmp4_init_filename", "init.mp4",
+            "-hls_segment_filename", os.path.join(rendition_dir, "seg_%05d.m4s"),
+            os.path.join(rendition_dir, "index.m3u8")
+        ])
+        if return_code != 0:
+            shutil.rmtree(tmp_dir)
+            raise RuntimeError("HLS packaging of %s failed with return code %s" % (path, return_code))
+        media = probe_media(path, ffprobe_path)
+        variants.append((rendition, media))
+
+    # Rendition la plus légère en premier : c'est celle que le lecteur choisit pour démarrer
+    with open(os.path.join(tmp_dir, "master.m3u8"), "w", encoding="utf-8") as f:
+        f.write("#EXTM3U\n#EXT-X-VERSION:7\n")
+        for rendition, media in sorted(variants, key=lambda v: v[1]["bitrate"]):
+            f.write('#EXT-X-STREAM-INF:BANDWIDTH=%d,RESOLUTION=%sx%s,NAME="%s"\n%s/index.m3u8\n' % (
+                media["bitrate"], media["width"], media["height"], rendition["name"], rendition["name"]))
+
+    shutil.rmtree(hls_dir, ignore_errors=True)
+    os.replace(tmp_dir, hls_dir)
+    return os.path.join(hls_dir, "master.m3u8")
+
+
+# Presets libx264 du plus rapide au plus lent
+X264_PRESETS = ["ultrafast", "superfast", "veryfast", "faster", "fast", "medium", "slow", "slower", "veryslow"]
+
+
+class PresetPolicy:
+    """
+    Choix automatique du preset selon la file de compression : idle quand
+    elle est vide, busy à partir de busy_depth jobs en attente, et les
+    presets intermédiaires entre les deux. Le preset choisi remplace celui de
+    la rendition principale ; les autres sont décalées d'autant de crans, ce
+    qui garde leurs écarts configurés.
+    """
+
+    def __init__(self, idle="medium", busy="veryfast", busy_depth=4):
+        self.idle = X264_PRESETS.index(idle)
+        self.busy = X264_PRESETS.index(busy)
+        self.busy_depth = max(1, busy_depth)
+
+    @classmethod
+    def from_benchmark(cls, results, min_ssim=0.95, busy_depth=4, crf=None):
+        """
+        À partir des résultats de encoder_bench.py : idle = preset qui donne
+        la plus petite sortie à qualité >= min_ssim, busy = le plus rapide
+        respectant ce même plancher. Seuls les résultats au CRF réellement
+        utilisé (ou au plus proche mesuré) sont comparés : taille et SSIM
+        d'un autre CRF ne disent rien du preset.
+        """
+        if crf is not None and results:
+            nearest = min({r["crf"] for r in results}, key=lambda c: abs(c - crf))
+            results = [r for r in results if r["crf"] == nearest]
+        ok = [r for r in results if r["ssim"] >= min_ssim] or results
+        idle = min(ok, key=lambda r: r["size"])["preset"]
+        busy = max(ok, key=lambda r: r["fps"])["preset"]
+        if X264_PRESETS.index(busy) > X264_PRESETS.index(idle):
+            idle, busy = busy, idle
+        return cls(idle, busy, busy_depth)
+
+    def preset(self, queue_depth):
+        ratio = min(1.0, queue_depth / self.busy_depth)
+        return X264_PRESETS[round(self.idle + (self.busy - self.idle) * ratio)]
+
+    def apply(self, renditions, queue_depth):
+        if not renditions:
+            return renditions
+        # File vide : le décalage peut ralentir les presets configurés, file pleine les accélérer
+        offset = X264_PRESETS.index(self.preset(queue_depth)) - X264_PRESETS.index(renditions[0]["preset"])
+        last = len(X264_PRESETS) - 1
+        return [
+            dict(rendition, preset=X264_PRESETS[min(max(X264_PRESETS.index(rendition["preset"]) + offset, 0), last)])
+            for rendition in renditions
+        ]
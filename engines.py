@@ -0,0 +1,81 @@
+"""
+Moteurs de transcription interchangeables. Chaque moteur prend un tableau
+PCM float32 16 kHz mono et renvoie [(début, fin, texte)] en secondes
+relatives au tableau. Les bibliothèques sont importées à la création du
+moteur : seule celle du moteur choisi doit être installée.
+
+Spécification en texte : "moteur[:modèle[:calcul]]", par exemple
+"stable-whisper:small", "openai-whisper:medium" ou "faster-whisper:small:int8".
+"""
+
+LANGUAGE = "fr"
+
+
+def set_torch_threads(threads):
+    if threads:
+        import torch
+        torch.set_num_threads(threads)
+
+
+class StableWhisperEngine:
+    """stable-ts sur le Whisper d'OpenAI (PyTorch, fp32 sur CPU) : le moteur historique de Recorder.py."""
+
+    name = "stable-whisper"
+
+    def __init__(self, model="small", threads=None, compute_type=None):
+        import stable_whisper
+        set_torch_threads(threads)
+        self.model = stable_whisper.load_model(model, device="cpu")
+
+    def transcribe(self, audio):
+        result = self.model.transcribe(audio, language=LANGUAGE, fp16=False)
+        return [(seg.start, seg.end, seg.text.strip()) for seg in result.segments]
+
+
+class OpenAIWhisperEngine:
+    """Whisper d'OpenAI sans stable-ts (le moteur de l'ancien transcribe_to_video_dir.sh, modèle medium)."""
+
+    name = "openai-whisper"
+
+    def __init__(self, model="medium", threads=None, compute_type=None):
+        import whisper
+        set_torch_threads(threads)
+        self.model = whisper.load_model(model, device="cpu")
+
+    def transcribe(self, audio):
+        result = self.model.transcribe(audio, language=LANGUAGE, fp16=False)
+        return [(seg["start"], seg["end"], seg["text"].strip()) for seg in result["segments"]]
+
+
+class FasterWhisperEngine:
+    """CTranslate2 (faster-whisper) : poids quantifiés int8 par défaut, bien plus rapide sur CPU."""
+
+    name = "faster-whisper"
+
+    def __init__(self, model="small", threads=None, compute_type="int8"):
+        from faster_whisper import WhisperModel
+        self.model = WhisperModel(model, device="cpu", compute_type=compute_type or "int8",
+                                  cpu_threads=threads or 0)
+
+    def transcribe(self, audio):
+        # Les segments sont produits à la demande : la liste force le décodage complet
+        segments, _ = self.model.transcribe(audio, language=LANGUAGE, beam_size=5)
+        return [(seg.start, seg.end, seg.text.strip()) for seg in segments]
+
+
+ENGINES = {engine.name: engine for engine in (StableWhisperEngine, OpenAIWhisperEngine, FasterWhisperEngine)}
+DEFAULT_ENGINE = "stable-whisper:small"
+
+
+def load_engine(spec=DEFAULT_ENGINE, threads=None):
+    name, _, rest = spec.partition(":")
+    model, _, compute_type = rest.partition(":")
+    if name not in ENGINES:
+        raise ValueError("Unknown transcription engine %r (known: %s)" % (name, ", ".join(ENGINES)))
+    kwargs = {"threads": threads, "compute_type": compute_type or None}
+    if model:
+        kwargs["model"] = model
+    engine = ENGINES[name](**kwargs)
+    # Spécification d'origine : sert de clé aux points de reprise de Recorder.py
+    engine.spec = spec
+    return engine
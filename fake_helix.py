@@ -0,0 +1,146 @@
+"""
+Faux serveur Helix local pour tester / benchmarker le client Twitch hors ligne.
+
+USAGE :
+    python fake_helix.py serve [--port 8080] [--online a,b,c]
+    python fake_helix.py bench [--channels 1000] [--rounds 20]
+
+Pour pointer le recorder dessus : helix_url = "http://127.0.0.1:8080/helix"
+et auth_url = "http://127.0.0.1:8080/oauth2" dans config.py.
+"""
+
+import argparse
+import asyncio
+import json
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlparse
+
+import requests
+
+from twitch_client import AIOHTTP_OK, AsyncTwitchClient, TwitchClient
+
+
+class FakeHelixHandler(BaseHTTPRequestHandler):
+    # HTTP/1.1 pour que le keep-alive soit réellement mesurable
+    protocol_version = "HTTP/1.1"
+    # Pas de Nagle : sinon en-têtes et corps partent en deux paquets et le keep-alive prend 40 ms de délai d'ACK
+    disable_nagle_algorithm = True
+    online = set()
+    ratelimit = 800
+
+    def send_json(self, code, payload, headers=None):
+        body = json.dumps(payload).encode()
+        self.send_response(code)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        for name, value in (headers or {}).items():
+            self.send_header(name, value)
+        self.end_headers()
+        self.wfile.write(body)
+
+    def do_POST(self):
+        if urlparse(self.path).path == "/oauth2/token":
+            self.send_json(200, {"access_token": "fake-token", "expires_in": 5184000, "token_type": "bearer"})
+        else:
+            self.send_json(404, {"error": "Not Found"})
+
+    def do_GET(self):
+        url = urlparse(self.path)
+        if url.path != "/helix/streams":
+            self.send_json(404, {"error": "Not Found"})
+            return
+        if self.headers.get("Authorization") != "Bearer fake-token":
+            self.send_json(401, {"error": "Unauthorized"})
+            return
+
+        logins = parse_qs(url.query).get("user_login", [])
+        data = [
+            {"user_login": login, "type": "live", "started_at": "2026-02-22T11:19:28Z"}
+            for login in logins if login in self.online
+        ]
+        self.send_json(200, {"data": data}, headers={
+            "Ratelimit-Limit": str(self.ratelimit),
+            "Ratelimit-Remaining": str(self.ratelimit - 1),
+            "Ratelimit-Reset": str(int(time.time()) + 60),
+        })
+
+    def log_message(self, format, *args):
+        pass
+
+
+def start_server(port=0, online=()):
+    FakeHelixHandler.online = set(online)
+    server = ThreadingHTTPServer(("127.0.0.1", port), FakeHelixHandler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
+
+
+def bench(channels, rounds):
+    server = start_server(online=["chan_%d" % i for i in range(0, channels, 10)])
+    base = "http://127.0.0.1:%d" % server.server_address[1]
+    usernames = ["chan_%d" % i for i in range(channels)]
+    kwargs = {"api_url": base + "/helix", "auth_url": base + "/oauth2"}
+
+    # Référence : requests.get nu, une connexion neuve par lot (ancien comportement)
+    start = time.perf_counter()
+    for _ in range(rounds):
+        for i in range(0, channels, 100):
+            requests.get(
+                base + "/helix/streams",
+                params=[("user_login", u) for u in usernames[i:i + 100]],
+                headers={"Authorization": "Bearer fake-token"},
+                timeout=15,
+            ).raise_for_status()
+    print("requests.get     : %.1f ms / round" % ((time.perf_counter() - start) * 1000 / rounds))
+
+    client = TwitchClient("fake", "fake", **kwargs)
+    client.fetch_access_token()
+    start = time.perf_counter()
+    for _ in range(rounds):
+        client.check_users(usernames)
+    print("TwitchClient     : %.1f ms / round" % ((time.perf_counter() - start) * 1000 / rounds))
+    client.close()
+
+    if AIOHTTP_OK:
+        async def run_async():
+            async with AsyncTwitchClient("fake", "fake", **kwargs) as async_client:
+                await async_client.fetch_access_token()
+                start = time.perf_counter()
+                for _ in range(rounds):
+                    await async_client.check_users(usernames)
+                return time.perf_counter() - start
+        elapsed = asyncio.run(run_async())
+        print("AsyncTwitchClient: %.1f ms / round" % (elapsed * 1000 / rounds))
+    else:
+        print("AsyncTwitchClient: skipped (aiohttp not installed)")
+
+    server.shutdown()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    sub = parser.add_subparsers(dest="command", required=True)
+    serve_parser = sub.add_parser("serve")
+    serve_parser.add_argument("--port", type=int, default=8080)
+    serve_parser.add_argument("--online", default="", help="chaînes en ligne, séparées par des virgules")
+    bench_parser = sub.add_parser("bench")
+    bench_parser.add_argument("--channels", type=int, default=1000)
+    bench_parser.add_argument("--rounds", type=int, default=20)
+    args = parser.parse_args()
+
+    if args.command == "serve":
+        server = start_server(args.port, [u for u in args.online.split(",") if u])
+        print("Fake Helix listening on http://127.0.0.1:%d" % server.server_address[1])
+        try:
+            while True:
+                time.sleep(3600)
+        except KeyboardInterrupt:
+            server.shutdown()
+    else:
+        bench(args.channels, args.rounds)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,91 @@
+import datetime
+import json
+import logging
+import os
+
+HOURS_PER_WEEK = 7 * 24
+
+
+def hour_of_week(moment):
+    moment = moment.astimezone(datetime.timezone.utc)
+    return moment.weekday() * 24 + moment.hour
+
+
+class PollScheduler:
+    """
+    Planifie les polls Helix chaîne par chaîne. Chaque début de stream
+    observé (une seule fois par started_at, même si l'enregistrement
+    redémarre) est compté dans un histogramme heure-de-la-semaine (UTC) :
+    autour des créneaux habituels on poll toutes les min_interval secondes,
+    hors créneau on s'éloigne jusqu'à max_interval. Sans historique,
+    on garde l'intervalle de base.
+    """
+
+    def __init__(self, path, usernames, base_interval, min_interval=5, max_interval=120):
+        self.path = path
+        self.base_interval = base_interval
+        self.min_interval = min_interval
+        self.max_interval = max_interval
+        # Dernier started_at compté par chaîne : un même stream n'est compté qu'une fois
+        self.last_start = {}
+        self.history = self._load()
+        self.next_poll = {username: 0.0 for username in usernames}
+
+    def _load(self):
+        if not os.path.exists(self.path):
+            return {}
+        try:
+            with open(self.path, encoding="utf-8") as f:
+                data = json.load(f)
+        except (OSError, ValueError) as e:
+            logging.error("Unreadable schedule history %s: %s", self.path, e)
+            return {}
+        if "counts" not in data:
+            # Ancien format : {chaîne: histogramme}
+            return data
+        self.last_start = data.get("last_start", {})
+        return data["counts"]
+
+    def _save(self):
+        tmp_path = self.path + ".tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump({"counts": self.history, "last_start": self.last_start}, f)
+        os.replace(tmp_path, self.path)
+
+    def record_start(self, username, started_at):
+        """started_at : champ 'started_at' Helix, ex. '2026-02-22T11:19:28Z'."""
+        if started_at and self.last_start.get(username) == started_at:
+            # Reconnexion streamlink ou Helix encore "live" après la fin : même stream
+            return
+        try:
+            moment = datetime.datetime.fromisoformat(started_at.replace("Z", "+00:00"))
+        except (AttributeError, ValueError):
+            moment = datetime.datetime.now(datetime.timezone.utc)
+        counts = self.history.setdefault(username, [0] * HOURS_PER_WEEK)
+        counts[hour_of_week(moment)] += 1
+        if started_at:
+            self.last_start[username] = started_at
+        self._save()
+
+    def interval(self, username, now):
+        counts = self.history.get(username)
+        if not counts or not any(counts):
+            return self.base_interval
+
+        # Poids du créneau courant et de ses voisins, relatif au créneau le plus fréquent
+        slot = hour_of_week(datetime.datetime.fromtimestamp(now, datetime.timezone.utc))
+        around = sum(counts[(slot + offset) % HOURS_PER_WEEK] for offset in (-1, 0, 1))
+        weight = min(1.0, around / max(counts))
+        return self.max_interval - weight * (self.max_interval - self.min_interval)
+
+    def schedule(self, username, now, delay=None):
+        if delay is None:
+            delay = self.interval(username, now)
+        self.next_poll[username] = now + delay
+        return delay
+
+    def due(self, now):
+        return [username for username, when in self.next_poll.items() if when <= now]
+
+    def sleep_time(self, now):
+        return max(0.0, min(self.next_poll.values()) - now)
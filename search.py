@@ -0,0 +1,237 @@
+"""
+Recherche plein texte dans les transcriptions (processed/<chaîne>/x.txt, écrites
+à côté des vidéos par Recorder.py, transcriber.py et transcribe_batch.py) :
+index SQLite FTS5 mis à jour incrémentalement, et petit endpoint HTTP
+/search?q=... (derrière nginx) qui renvoie des couples (vidéo, instant).
+
+Requêtes : mots (tous requis), "expression exacte" et préfixes (mot*).
+
+USAGE :
+    python search.py <root_path> index              # indexe les transcriptions nouvelles ou modifiées
+    python search.py <root_path> query "mots"       # recherche en ligne de commande
+    python search.py <root_path> serve [--port 8090] [--interval 60]
+"""
+
+import argparse
+import json
+import logging
+import os
+import re
+import sqlite3
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlparse
+
+# Ligne écrite par Recorder.py : '[0:00:01 - 0:00:04] LOCUTEUR 1 : texte'
+LINE_RE = re.compile(r"^\[(\d+):(\d{2}):(\d{2}) - (\d+):(\d{2}):(\d{2})\] LOCUTEUR (\d+) : (.*)$")
+QUERY_RE = re.compile(r'"([^"]*)"|(\S+)')
+# Marqueurs de snippet : le client les remplace par <mark> sans interpréter de HTML
+MATCH_START = "\x02"
+MATCH_END = "\x03"
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS transcripts (
+    path TEXT PRIMARY KEY,
+    video TEXT NOT NULL,
+    mtime REAL NOT NULL,
+    size INTEGER NOT NULL
+);
+CREATE VIRTUAL TABLE IF NOT EXISTS segments USING fts5(
+    text,
+    video UNINDEXED,
+    start UNINDEXED,
+    end UNINDEXED,
+    speaker UNINDEXED,
+    tokenize = "unicode61 remove_diacritics 2"
+);
+"""
+
+
+def parse_transcript(path):
+    """Segments (début, fin, locuteur, texte) en secondes ; les lignes d'un autre format sont ignorées."""
+    segments = []
+    with open(path, encoding="utf-8", errors="replace") as f:
+        for line in f:
+            match = LINE_RE.match(line.rstrip("\n"))
+            if not match:
+                continue
+            h1, m1, s1, h2, m2, s2, speaker, text = match.groups()
+            segments.append((
+                int(h1) * 3600 + int(m1) * 60 + int(s1),
+                int(h2) * 3600 + int(m2) * 60 + int(s2),
+                int(speaker),
+                text,
+            ))
+    return segments
+
+
+def fts_query(query):
+    """
+    Traduit la saisie utilisateur en expression FTS5 sûre : chaque mot est cité
+    (pas d'opérateurs injectés), "..." reste une expression, mot* un préfixe.
+    """
+    terms = []
+    for phrase, word in QUERY_RE.findall(query):
+        prefix = word.endswith("*")
+        text = (phrase or word.rstrip("*")).replace('"', "")
+        if not text.strip():
+            continue
+        terms.append('"%s"%s' % (text, "*" if prefix else ""))
+    return " ".join(terms)
+
+
+class TranscriptIndex:
+    def __init__(self, root_path, db_path=None):
+        self.root_path = root_path
+        self.db_path = db_path or os.path.join(root_path, "transcripts.sqlite")
+        self.lock = threading.Lock()
+        with self.connect() as db:
+            db.executescript(SCHEMA)
+
+    def connect(self):
+        # Une connexion par appel : le serveur HTTP répond depuis plusieurs threads
+        return sqlite3.connect(self.db_path, timeout=30)
+
+    def url(self, path):
+        return "/" + os.path.relpath(path, self.root_path).replace(os.sep, "/")
+
+    def transcripts(self):
+        processed_root = os.path.join(self.root_path, "processed")
+        if not os.path.isdir(processed_root):
+            return
+        for channel in sorted(os.listdir(processed_root)):
+            channel_path = os.path.join(processed_root, channel)
+            if not os.path.isdir(channel_path):
+                continue
+            for entry in os.scandir(channel_path):
+                # La transcription d'une vidéo 'x.mp4' est 'x.txt' (transcriber.py, transcribe_batch.py)
+                if entry.is_file() and entry.name.endswith(".txt"):
+                    video = os.path.splitext(entry.path)[0] + ".mp4"
+                    if os.path.exists(video):
+                        yield entry.path, video, entry.stat()
+
+    def update(self):
+        """Indexe les transcriptions nouvelles ou modifiées et oublie celles qui ont disparu (éviction)."""
+        with self.lock, self.connect() as db:
+            known = {path: (mtime, size) for path, mtime, size in db.execute("SELECT path, mtime, size FROM transcripts")}
+            seen = set()
+            changed = 0
+            for path, video, stat in self.transcripts():
+                seen.add(path)
+                if known.get(path) == (stat.st_mtime, stat.st_size):
+                    continue
+                url = self.url(video)
+                db.execute("DELETE FROM segments WHERE video = ?", (url,))
+                db.executemany(
+                    "INSERT INTO segments (text, video, start, end, speaker) VALUES (?, ?, ?, ?, ?)",
+                    [(text, url, start, end, speaker) for start, end, speaker, text in parse_transcript(path)]
+                )
+                db.execute("INSERT OR REPLACE INTO transcripts (path, video, mtime, size) VALUES (?, ?, ?, ?)",
+                           (path, url, stat.st_mtime, stat.st_size))
+                changed += 1
+            for path in set(known) - seen:
+                video = db.execute("SELECT video FROM transcripts WHERE path = ?", (path,)).fetchone()[0]
+                db.execute("DELETE FROM segments WHERE video = ?", (video,))
+                db.execute("DELETE FROM transcripts WHERE path = ?", (path,))
+                changed += 1
+        if changed:
+            logging.info("Search index updated (%s transcripts changed)", changed)
+        return changed
+
+    def search(self, query, limit=50):
+        expression = fts_query(query)
+        if not expression:
+            return []
+        with self.connect() as db:
+            try:
+                rows = db.execute(
+                    "SELECT video, start, end, speaker, snippet(segments, 0, ?, ?, '…', 16) "
+                    "FROM segments WHERE segments MATCH ? ORDER BY rank LIMIT ?",
+                    (MATCH_START, MATCH_END, expression, limit)
+                ).fetchall()
+            except sqlite3.OperationalError as e:
+                logging.warning("Invalid search query %r: %s", query, e)
+                return []
+        return [
+            {
+                "video": video,
+                "channel": video.split("/")[-2],
+                "title": os.path.splitext(video.split("/")[-1])[0],
+                "start": start,
+                "end": end,
+                "speaker": speaker,
+                "text": snippet,
+            }
+            for video, start, end, speaker, snippet in rows
+        ]
+
+
+class SearchHandler(BaseHTTPRequestHandler):
+    index = None
+
+    def do_GET(self):
+        url = urlparse(self.path)
+        if url.path != "/search":
+            self.send_error(404)
+            return
+        params = parse_qs(url.query)
+        query = params.get("q", [""])[0]
+        try:
+            limit = min(max(int(params.get("limit", ["50"])[0]), 1), 200)
+        except ValueError:
+            limit = 50
+        body = json.dumps({"query": query, "hits": self.index.search(query, limit)}, ensure_ascii=False).encode()
+        self.send_response(200)
+        self.send_header("Content-Type", "application/json; charset=utf-8")
+        self.send_header("Cache-Control", "no-cache")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass
+
+
+def serve(index, port, host="127.0.0.1", interval=60):
+    handler = type("BoundSearchHandler", (SearchHandler,), {"index": index})
+    server = ThreadingHTTPServer((host, port), handler)
+
+    def refresh():
+        # Les transcriptions arrivent au fil de l'eau (transcriber.py) : réindexation périodique
+        while True:
+            try:
+                index.update()
+            except Exception as e:
+                logging.error("Search index update failed: %s", e)
+            time.sleep(interval)
+
+    threading.Thread(target=refresh, name="search-index", daemon=True).start()
+    logging.info("Search available on http://%s:%s/search", host, port)
+    server.serve_forever()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("root_path")
+    parser.add_argument("command", choices=["index", "query", "serve"])
+    parser.add_argument("query", nargs="?", default="")
+    parser.add_argument("--port", type=int, default=8090)
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--interval", type=int, default=60, help="secondes entre deux réindexations (serve)")
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO, format='%(message)s')
+    index = TranscriptIndex(args.root_path)
+    if args.command == "index":
+        index.update()
+    elif args.command == "query":
+        for hit in index.search(args.query):
+            text = hit["text"].replace(MATCH_START, "*").replace(MATCH_END, "*")
+            print("%s  %s  %s" % (hit["video"], time.strftime("%H:%M:%S", time.gmtime(hit["start"])), text))
+    else:
+        serve(index, args.port, args.host, args.interval)
+
+
+if __name__ == "__main__":
+    main()
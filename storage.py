@@ -0,0 +1,199 @@
+import glob
+import logging
+import os
+import shutil
+import threading
+
+from catalogue import main_rendition
+
+EVICT_OLDEST = "oldest"
+EVICT_ORIGINALS_FIRST = "originals_first"
+
+
+class StorageManager:
+    """
+    Budget disque pour recorded/ et processed/ : quotas global et par chaîne,
+    seuil bas d'espace libre vérifié avant chaque enregistrement, et éviction
+    selon une politique. Les tailles sont tenues dans un index incrémental
+    (un seul parcours au démarrage, puis track/forget) pour ne jamais
+    re-parcourir les dossiers à chaque poll.
+    """
+
+    def __init__(self, root_path, usernames, global_quota=None, channel_quota=None,
+                 low_watermark=0, policy=EVICT_OLDEST, protected=None, on_evict=None):
+        self.root_path = root_path
+        self.global_quota = global_quota
+        # Un entier pour toutes les chaînes, ou un dict {chaîne: octets}
+        self.channel_quota = channel_quota
+        self.low_watermark = low_watermark
+        self.policy = policy
+        # Callable renvoyant les chemins à ne jamais supprimer (enregistrements, jobs en attente)
+        self.protected = protected or (lambda: set())
+        # Callback appelé après chaque suppression (ex. mise à jour du catalogue)
+        self.on_evict = on_evict
+        self.lock = threading.Lock()
+        # ensure_space est appelé par le thread de surveillance et par loop_check :
+        # une seule éviction à la fois, sinon les deux vident le disque du double
+        self.evict_lock = threading.Lock()
+        self.index = {}
+        for username in usernames:
+            for kind in ("recorded", "processed"):
+                self._scan(os.path.join(root_path, kind, username), kind, username)
+
+    def _scan(self, path, kind, username):
+        if not os.path.isdir(path):
+            return
+        for entry in os.scandir(path):
+            if entry.is_file() and entry.name.endswith(".mp4"):
+                stat = entry.stat()
+                self.index[entry.path] = (kind, username, self._footprint(entry.path, stat.st_size), stat.st_mtime)
+
+    def _footprint(self, path, size):
+        """
+        Taille d'une vidéo plus celle de ce que _evict supprime avec elle :
+        prévisualisations et arborescence HLS (une seconde copie de chaque rendition).
+        """
+        base = os.path.splitext(path)[0]
+        for sidecar in [base + ".poster.jpg", base + ".thumbs.vtt"] + glob.glob(glob.escape(base) + ".sprite-*.jpg"):
+            try:
+                size += os.path.getsize(sidecar)
+            except OSError:
+                pass
+        for directory, _, names in os.walk(base + ".hls"):
+            for name in names:
+                try:
+                    size += os.path.getsize(os.path.join(directory, name))
+                except OSError:
+                    pass
+        return size
+
+    def track(self, path):
+        """
+        À appeler quand un fichier final apparaît ou change de taille, et de
+        nouveau sur la vidéo principale une fois son HLS empaqueté.
+        """
+        kind, username = self._classify(path)
+        if kind is None or not os.path.exists(path):
+            return
+        stat = os.stat(path)
+        size = self._footprint(path, stat.st_size)
+        with self.lock:
+            self.index[path] = (kind, username, size, stat.st_mtime)
+
+    def forget(self, path):
+        with self.lock:
+            self.index.pop(path, None)
+
+    def _classify(self, path):
+        relative = os.path.relpath(path, self.root_path).split(os.sep)
+        if len(relative) == 3 and relative[0] in ("recorded", "processed"):
+            return relative[0], relative[1]
+        return None, None
+
+    def used(self, username=None):
+        with self.lock:
+            return sum(
+                size for _, owner, size, _ in self.index.values()
+                if username is None or owner == username
+            )
+
+    def quota_for(self, username):
+        if isinstance(self.channel_quota, dict):
+            return self.channel_quota.get(username)
+        return self.channel_quota
+
+    def free(self):
+        return shutil.disk_usage(self.root_path).free
+
+    def _main_path(self, path):
+        """'x.720p.mp4' -> 'x.mp4' si la vidéo principale est indexée, sinon None."""
+        return main_rendition(path, self.index)
+
+    def _processed_path(self, path):
+        """Sortie compressée d'un original de recorded/ ('recorded/<chaîne>/x.mp4' -> 'processed/<chaîne>/x.mp4')."""
+        kind, username = self._classify(path)
+        if kind != "recorded":
+            return None
+        return os.path.join(self.root_path, "processed", username, os.path.basename(path))
+
+    def _renditions(self, path):
+        """Renditions secondaires indexées d'une vidéo principale."""
+        with self.lock:
+            return [other for other in self.index if other != path and self._main_path(other) == path]
+
+    def _candidates(self, username=None):
+        protected = self.protected()
+        with self.lock:
+            # Les renditions secondaires partent avec leur vidéo principale, jamais seules
+            files = [
+                (path, kind, mtime)
+                for path, (kind, owner, _, mtime) in self.index.items()
+                if (username is None or owner == username) and path not in protected
+                and self._main_path(path) is None
+            ]
+            # Un original n'est en double que si sa version compressée existe ; sinon
+            # (compression échouée, sortie du journal) c'est la seule copie
+            duplicated = {path for path, kind, _ in files if kind == "recorded" and self._processed_path(path) in self.index}
+        if self.policy == EVICT_ORIGINALS_FIRST:
+            files.sort(key=lambda f: (f[0] not in duplicated, f[2]))
+        else:
+            files.sort(key=lambda f: f[2])
+        return [path for path, _, _ in files]
+
+    def _remove(self, path):
+        try:
+            os.remove(path)
+        except FileNotFoundError:
+            pass
+        except OSError as e:
+            # Un fichier impossible à supprimer ne doit pas tuer l'appelant (watcher ou boucle de poll)
+            logging.error("Cannot evict %s: %s", path, e)
+
+    def _evict(self, path):
+        logging.warning("Storage budget exceeded, evicting %s", path)
+        renditions = self._renditions(path)
+        for video in [path] + renditions:
+            self._remove(video)
+            self.forget(video)
+        # Fichiers annexes d'une vidéo compressée : prévisualisations, transcription et HLS
+        base = os.path.splitext(path)[0]
+        for sidecar in [base + ".poster.jpg", base + ".thumbs.vtt", base + ".txt"] + glob.glob(glob.escape(base) + ".sprite-*.jpg"):
+            self._remove(sidecar)
+        shutil.rmtree(base + ".hls", ignore_errors=True)
+        if self.on_evict:
+            try:
+                self.on_evict(path)
+            except Exception as e:
+                logging.error("Eviction callback failed for %s: %s", path, e)
+
+    def ensure_space(self, username=None, needed=0):
+        """
+        Libère de la place jusqu'à respecter les quotas et le seuil bas
+        en prévoyant `needed` octets supplémentaires. Renvoie False si
+        l'éviction n'a pas suffi.
+        """
+        with self.evict_lock:
+            return self._ensure_space(username, needed)
+
+    def _ensure_space(self, username, needed):
+        quota = self.quota_for(username) if username else None
+        if quota is not None:
+            for path in self._candidates(username):
+                if self.used(username) + needed <= quota:
+                    break
+                self._evict(path)
+
+        for path in self._candidates():
+            if self._within_budget(needed):
+                break
+            self._evict(path)
+
+        ok = self._within_budget(needed) and (quota is None or self.used(username) + needed <= quota)
+        if not ok:
+            logging.error("Not enough storage for %s bytes (free %s, used %s)", needed, self.free(), self.used())
+        return ok
+
+    def _within_budget(self, needed):
+        if self.free() - needed < self.low_watermark:
+            return False
+        return self.global_quota is None or self.used() + needed <= self.global_quota
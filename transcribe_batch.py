@@ -0,0 +1,70 @@
+"""
+Transcription par lot de vidéos (remplace transcribe_to_video_dir.sh).
+Le modèle est chargé une seule fois par worker pour tout le lot ; l'audio est
+lu directement depuis la vidéo (pas de WAV intermédiaire) et les morceaux
+d'une vidéo sont transcrits en parallèle. Chaque vidéo obtient une
+transcription horodatée à côté d'elle ('x.mp4' -> 'x.txt').
+
+USAGE :
+    python transcribe_batch.py <vidéo ou dossier> [...] [--workers 2] [--threads N]
+                               [--engine openai-whisper:medium] [--force]
+"""
+
+import argparse
+import os
+
+from catalogue import main_rendition
+from engines import DEFAULT_ENGINE
+from Recorder import transcribe_video, worker_pool
+from transcriber import transcript_path
+
+
+def find_videos(paths):
+    """Fichiers donnés tels quels, dossiers parcourus récursivement (sans les renditions secondaires)."""
+    videos = []
+    for path in paths:
+        if not os.path.isdir(path):
+            videos.append(path)
+            continue
+        for directory, _, names in sorted(os.walk(path)):
+            for name in sorted(names):
+                if not name.endswith(".mp4"):
+                    continue
+                if main_rendition(name, names):
+                    continue
+                videos.append(os.path.join(directory, name))
+    return videos
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("paths", nargs="+")
+    parser.add_argument("--workers", type=int, default=2, help="morceaux transcrits en parallèle")
+    parser.add_argument("--threads", type=int, default=None, help="threads torch par worker")
+    parser.add_argument("--engine", default=DEFAULT_ENGINE, help="moteur[:modèle[:calcul]], voir engines.py")
+    parser.add_argument("--force", action="store_true", help="retranscrit les vidéos qui ont déjà un .txt")
+    args = parser.parse_args()
+
+    videos = [
+        video for video in find_videos(args.paths)
+        if args.force or not os.path.exists(transcript_path(video))
+    ]
+    if not videos:
+        print("Rien à transcrire.")
+        return
+
+    print(f"--- {len(videos)} vidéo(s) | {args.engine} x{args.workers} ---")
+    with worker_pool(args.workers, args.threads, args.engine) as pool:
+        for index, video in enumerate(videos):
+            print(f"\n[{index + 1}/{len(videos)}] {video}")
+            try:
+                transcribe_video(None, video, transcript_path(video), pool=pool, engine=args.engine)
+            except Exception as e:
+                # Un échec laisse le point de reprise : la vidéo reprendra au prochain lancement
+                print(f"[ERREUR] {video} : {e}")
+                continue
+            print(f"Transcription : {transcript_path(video)}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,167 @@
+"""
+Service de transcription : surveille processed/<chaîne>/ et transcrit chaque
+nouvelle vidéo compressée. Le modèle Whisper est chargé une seule fois par
+worker pour toute la durée de vie du service, pas une fois par vidéo.
+La transcription est écrite à côté de la vidéo ('x.mp4' -> 'x.txt').
+
+USAGE :
+    python transcriber.py <root_path> [--workers 1] [--threads N]
+                          [--engine faster-whisper:small:int8]
+                          [--priority newest|oldest] [--interval 60] [--once]
+"""
+
+import argparse
+import heapq
+import logging
+import os
+import threading
+import time
+
+from catalogue import main_rendition
+from engines import DEFAULT_ENGINE
+import Recorder
+from Recorder import CHUNK_SIZE, transcribe_video, worker_pool
+
+NEWEST_FIRST = "newest"
+OLDEST_FIRST = "oldest"
+# Une vidéo modifiée il y a moins de MIN_AGE secondes est peut-être encore en cours d'écriture
+MIN_AGE = 120
+
+
+def _transcribe_job(video_path, output_file, chunk_size):
+    # Modèle chargé par Recorder._init_worker dans ce process du pool
+    transcribe_video(Recorder._worker_model, video_path, output_file, chunk_size)
+    return video_path
+
+
+def transcript_path(video_path):
+    return os.path.splitext(video_path)[0] + ".txt"
+
+
+class TranscriptionDaemon:
+    """
+    File de priorité de vidéos à transcrire servie par un pool de process.
+    Au plus `workers` vidéos sont confiées au pool à la fois : une vidéo
+    découverte plus tard peut donc passer devant celles encore en attente.
+    """
+
+    def __init__(self, root_path, workers=1, threads=None, priority=NEWEST_FIRST,
+                 interval=60, chunk_size=CHUNK_SIZE, engine=DEFAULT_ENGINE, min_age=MIN_AGE):
+        self.processed_root = os.path.join(root_path, "processed")
+        self.workers = max(1, workers)
+        self.threads = threads
+        self.engine = engine
+        self.priority = priority
+        self.interval = interval
+        self.chunk_size = chunk_size
+        self.min_age = min_age
+        self.lock = threading.Lock()
+        self.wakeup = threading.Event()
+        self.pending = []
+        # Vidéos en attente ou en cours, et échecs à ne pas reprendre en boucle
+        self.known = set()
+        self.failed = set()
+        self.running = 0
+
+    def candidates(self):
+        """Vidéos principales de processed/ sans transcription (les renditions secondaires sont ignorées)."""
+        if not os.path.isdir(self.processed_root):
+            return
+        for channel in sorted(os.listdir(self.processed_root)):
+            channel_path = os.path.join(self.processed_root, channel)
+            if not os.path.isdir(channel_path):
+                continue
+            names = set(os.listdir(channel_path))
+            for name in names:
+                if not name.endswith(".mp4"):
+                    continue
+                if main_rendition(name, names):
+                    continue
+                path = os.path.join(channel_path, name)
+                if not os.path.exists(transcript_path(path)):
+                    yield path
+
+    def scan(self):
+        for path in self.candidates():
+            with self.lock:
+                if path in self.known or path in self.failed:
+                    continue
+                try:
+                    mtime = os.path.getmtime(path)
+                except FileNotFoundError:
+                    continue
+                if time.time() - mtime < self.min_age:
+                    # Reprise au prochain parcours, une fois le fichier stable
+                    continue
+                key = -mtime if self.priority == NEWEST_FIRST else mtime
+                heapq.heappush(self.pending, (key, path))
+                self.known.add(path)
+                logging.info("Queued transcription of %s (%s pending)", path, len(self.pending))
+
+    def _done(self, video_path):
+        logging.info("Transcription ready: %s", transcript_path(video_path))
+        self._finish(video_path)
+
+    def _failed(self, video_path, error):
+        logging.error("Transcription of %s failed: %s", video_path, error)
+        with self.lock:
+            self.failed.add(video_path)
+        self._finish(video_path)
+
+    def _finish(self, video_path):
+        with self.lock:
+            self.known.discard(video_path)
+            self.running -= 1
+        self.wakeup.set()
+
+    def dispatch(self, pool):
+        with self.lock:
+            while self.pending and self.running < self.workers:
+                _, path = heapq.heappop(self.pending)
+                self.running += 1
+                logging.info("Transcribing %s", path)
+                pool.apply_async(
+                    _transcribe_job, (path, transcript_path(path), self.chunk_size),
+                    callback=self._done,
+                    error_callback=lambda e, path=path: self._failed(path, e),
+                )
+
+    def idle(self):
+        with self.lock:
+            return not self.pending and self.running == 0
+
+    def run(self, once=False):
+        logging.info("Loading %s transcription worker(s)", self.workers)
+        with worker_pool(self.workers, self.threads, self.engine) as pool:
+            if once:
+                self.scan()
+            while True:
+                if not once:
+                    self.scan()
+                self.dispatch(pool)
+                if once and self.idle():
+                    break
+                # Réveil à la fin d'un job ou au prochain parcours de processed/
+                self.wakeup.wait(self.interval)
+                self.wakeup.clear()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("root_path")
+    parser.add_argument("--workers", type=int, default=1, help="vidéos transcrites en parallèle")
+    parser.add_argument("--threads", type=int, default=None, help="threads torch par worker")
+    parser.add_argument("--engine", default=DEFAULT_ENGINE, help="moteur[:modèle[:calcul]], voir engines.py")
+    parser.add_argument("--priority", choices=[NEWEST_FIRST, OLDEST_FIRST], default=NEWEST_FIRST)
+    parser.add_argument("--interval", type=int, default=60, help="secondes entre deux parcours de processed/")
+    parser.add_argument("--once", action="store_true", help="traite les vidéos présentes puis s'arrête")
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO, format='%(message)s')
+    daemon = TranscriptionDaemon(args.root_path, args.workers, args.threads, args.priority,
+                                 args.interval, engine=args.engine)
+    daemon.run(args.once)
+
+
+if __name__ == "__main__":
+    main()
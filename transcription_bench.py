@@ -0,0 +1,127 @@
+"""
+Benchmark hors ligne des moteurs de transcription (engines.py) sur des clips
+locaux : facteur temps réel (RTF), pic de mémoire (RSS) et accord mot à mot.
+
+USAGE :
+    python transcription_bench.py clip1.mp4 [clip2.mp4 ...]
+        [--engines stable-whisper:small,faster-whisper:small:int8,openai-whisper:medium]
+        [--threads N] [--output transcription_bench.json]
+
+La référence d'un clip est 'clip.txt' à côté de lui (texte brut ou transcription
+au format de Recorder.py). Sans référence, le premier moteur de la liste sert
+de référence aux autres.
+"""
+
+import argparse
+import json
+import multiprocessing
+import os
+import re
+import resource
+import subprocess
+import time
+
+from engines import load_engine
+from Recorder import SAMPLE_RATE, pcm_command, pcm_to_float
+
+# Préfixe des lignes écrites par Recorder.py : '[0:00:01 - 0:00:04] LOCUTEUR 1 : '
+TRANSCRIPT_PREFIX_RE = re.compile(r"^\[[^\]]*\]\s*LOCUTEUR \d+ : ", re.MULTILINE)
+WORD_RE = re.compile(r"[\w']+")
+
+
+def words(text):
+    return WORD_RE.findall(TRANSCRIPT_PREFIX_RE.sub("", text).lower().replace("’", "'"))
+
+
+def word_agreement(reference, hypothesis):
+    """1 - WER (distance d'édition sur les mots, bornée à 0)."""
+    if not reference:
+        return 1.0 if not hypothesis else 0.0
+    previous = list(range(len(hypothesis) + 1))
+    for i, ref_word in enumerate(reference, 1):
+        current = [i]
+        for j, hyp_word in enumerate(hypothesis, 1):
+            current.append(min(previous[j] + 1, current[j - 1] + 1, previous[j - 1] + (ref_word != hyp_word)))
+        previous = current
+    return max(0.0, 1 - previous[-1] / len(reference))
+
+
+def _bench_engine(spec, clips, threads):
+    # Exécuté dans un process neuf par moteur : le pic RSS mesuré est celui de ce moteur seul
+    start = time.perf_counter()
+    engine = load_engine(spec, threads)
+    load_time = time.perf_counter() - start
+
+    results = []
+    for clip in clips:
+        audio = pcm_to_float(subprocess.check_output(pcm_command(clip)))
+        duration = len(audio) / SAMPLE_RATE
+        start = time.perf_counter()
+        segments = engine.transcribe(audio)
+        elapsed = time.perf_counter() - start
+        results.append({
+            "clip": clip,
+            "duration": duration,
+            "elapsed": elapsed,
+            "rtf": elapsed / max(duration, 1e-6),
+            "text": " ".join(text for _, _, text in segments),
+        })
+    # ru_maxrss est en kilo-octets sous Linux
+    peak_rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * 1024
+    return {"engine": spec, "load_time": load_time, "peak_rss": peak_rss, "clips": results}
+
+
+def reference_text(clip):
+    path = os.path.splitext(clip)[0] + ".txt"
+    if not os.path.exists(path):
+        return None
+    with open(path, encoding="utf-8") as f:
+        return f.read()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("clips", nargs="+")
+    parser.add_argument("--engines", default="stable-whisper:small,faster-whisper:small:int8")
+    parser.add_argument("--threads", type=int, default=None)
+    parser.add_argument("--output", default="transcription_bench.json")
+    args = parser.parse_args()
+
+    specs = args.engines.split(",")
+    context = multiprocessing.get_context("spawn")
+    runs = []
+    for spec in specs:
+        print("Moteur %s..." % spec)
+        with context.Pool(1) as pool:
+            runs.append(pool.apply(_bench_engine, (spec, args.clips, args.threads)))
+
+    references = {clip: reference_text(clip) for clip in args.clips}
+    for clip in args.clips:
+        if references[clip] is None:
+            references[clip] = next(r["text"] for r in runs[0]["clips"] if r["clip"] == clip)
+
+    summary = []
+    print("\n%-32s %8s %8s %10s %9s" % ("moteur", "charg.", "RTF", "RSS max", "accord"))
+    for run in runs:
+        for result in run["clips"]:
+            result["agreement"] = word_agreement(words(references[result["clip"]]), words(result["text"]))
+        total_duration = sum(r["duration"] for r in run["clips"])
+        entry = {
+            "engine": run["engine"],
+            "load_time": run["load_time"],
+            "rtf": sum(r["elapsed"] for r in run["clips"]) / max(total_duration, 1e-6),
+            "peak_rss": run["peak_rss"],
+            # Moyenne pondérée par la durée des clips
+            "agreement": sum(r["agreement"] * r["duration"] for r in run["clips"]) / max(total_duration, 1e-6),
+        }
+        summary.append(entry)
+        print("%-32s %7.1fs %8.3f %7.0f Mo %8.1f%%" % (
+            entry["engine"][:32], entry["load_time"], entry["rtf"], entry["peak_rss"] / 1e6, 100 * entry["agreement"]))
+
+    with open(args.output, "w", encoding="utf-8") as f:
+        json.dump({"runs": runs, "summary": summary}, f, indent=2, ensure_ascii=False)
+    print("Résultats : %s" % args.output)
+
+
+if __name__ == "__main__":
+    main()
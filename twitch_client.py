@@ -0,0 +1,237 @@
+import asyncio
+import enum
+import json
+import logging
+import os
+import time
+
+import requests
+from requests.adapters import HTTPAdapter
+
+try:
+    import aiohttp
+    AIOHTTP_OK = True
+except ImportError:
+    AIOHTTP_OK = False
+
+
+class TwitchResponseStatus(enum.Enum):
+    ONLINE = 0
+    OFFLINE = 1
+    NOT_FOUND = 2
+    UNAUTHORIZED = 3
+    ERROR = 4
+
+# Helix accepte jusqu'à 100 paramètres user_login par requête
+HELIX_BATCH_SIZE = 100
+# Requêtes gardées en réserve dans le bucket Helix avant d'attendre le reset
+RATELIMIT_RESERVE = 5
+# Marge avant expiration d'un token en cache
+TOKEN_EXPIRY_MARGIN = 3600
+
+API_URL = "https://api.twitch.tv/helix"
+AUTH_URL = "https://id.twitch.tv/oauth2"
+
+
+class BaseTwitchClient:
+    """Logique commune aux clients synchrone et asyncio : cache du token, rate limit, parsing."""
+
+    def __init__(self, client_id, client_secret, token_cache=None, api_url=API_URL, auth_url=AUTH_URL):
+        self.client_id = client_id
+        self.client_secret = client_secret
+        self.token_cache = token_cache
+        self.streams_url = api_url + "/streams"
+        self.token_url = auth_url + "/token"
+        self.token_params = {
+            "client_id": client_id,
+            "client_secret": client_secret,
+            "grant_type": "client_credentials",
+        }
+        self.access_token = None
+        self.ratelimit_remaining = None
+        self.ratelimit_reset = 0
+
+    def headers(self):
+        return {
+            "Client-ID": self.client_id,
+            "Authorization": "Bearer " + self.access_token
+        }
+
+    def cached_token(self):
+        # Un token d'app vaut ~60 jours : on le réutilise entre les redémarrages
+        if not self.token_cache or not os.path.exists(self.token_cache):
+            return None
+        try:
+            with open(self.token_cache, encoding="utf-8") as f:
+                cached = json.load(f)
+            if cached["client_id"] == self.client_id and cached["expires_at"] - time.time() > TOKEN_EXPIRY_MARGIN:
+                return cached["access_token"]
+        except (OSError, ValueError, KeyError) as e:
+            logging.error("Ignoring unreadable token cache: %s", e)
+        return None
+
+    def store_token(self, token):
+        self.access_token = token["access_token"]
+        if self.token_cache:
+            fd = os.open(self.token_cache, os.O_WRONLY | os.O_CREAT | os.O_TRUNC, 0o600)
+            with os.fdopen(fd, "w", encoding="utf-8") as f:
+                json.dump({
+                    "client_id": self.client_id,
+                    "access_token": token["access_token"],
+                    "expires_at": time.time() + token.get("expires_in", 0),
+                }, f)
+        return self.access_token
+
+    def ratelimit_delay(self):
+        if self.ratelimit_remaining is not None and self.ratelimit_remaining <= RATELIMIT_RESERVE:
+            self.ratelimit_remaining = None
+            return max(0.0, self.ratelimit_reset - time.time())
+        return 0.0
+
+    def update_ratelimit(self, headers):
+        try:
+            self.ratelimit_remaining = int(headers["Ratelimit-Remaining"])
+            self.ratelimit_reset = int(headers["Ratelimit-Reset"])
+        except (KeyError, ValueError):
+            pass
+
+    def batches(self, usernames):
+        for i in range(0, len(usernames), HELIX_BATCH_SIZE):
+            yield usernames[i:i + HELIX_BATCH_SIZE]
+
+    def parse_streams(self, batch, info, statuses):
+        streams = {
+            stream["user_login"].lower(): stream
+            for stream in info["data"]
+        }
+        for username in batch:
+            stream = streams.get(username.lower())
+            if stream is None:
+                statuses[username] = (TwitchResponseStatus.OFFLINE, None)
+            else:
+                statuses[username] = (TwitchResponseStatus.ONLINE, {"data": [stream]})
+
+    def status_for_code(self, status_code):
+        if status_code == 401:
+            return TwitchResponseStatus.UNAUTHORIZED
+        return TwitchResponseStatus.ERROR
+
+
+class TwitchClient(BaseTwitchClient):
+    """Client Helix synchrone sur une requests.Session : connexions keep-alive réutilisées entre les polls."""
+
+    def __init__(self, *args, pool_size=10, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=pool_size, pool_maxsize=pool_size)
+        self.session.mount("https://", adapter)
+        self.session.mount("http://", adapter)
+
+    def fetch_access_token(self, force=False):
+        if not force:
+            cached = self.cached_token()
+            if cached:
+                self.access_token = cached
+                return cached
+
+        token_response = self.session.post(self.token_url, params=self.token_params, timeout=15)
+        token_response.raise_for_status()
+        return self.store_token(token_response.json())
+
+    def wait_for_ratelimit(self):
+        delay = self.ratelimit_delay()
+        if delay > 0:
+            logging.info("Helix rate limit nearly exhausted, waiting %.0f seconds", delay)
+            time.sleep(delay)
+
+    def check_users(self, usernames):
+        """Un seul GET /helix/streams par lot de HELIX_BATCH_SIZE chaînes."""
+        statuses = {}
+        for batch in self.batches(usernames):
+            self.wait_for_ratelimit()
+            try:
+                r = self.session.get(
+                    self.streams_url,
+                    params=[("user_login", username) for username in batch],
+                    headers=self.headers(),
+                    timeout=15
+                )
+                self.update_ratelimit(r.headers)
+                r.raise_for_status()
+                self.parse_streams(batch, r.json(), statuses)
+
+            except requests.exceptions.RequestException as e:
+                status_code = e.response.status_code if e.response is not None else None
+                for username in batch:
+                    statuses[username] = (self.status_for_code(status_code), None)
+
+        return statuses
+
+    def close(self):
+        self.session.close()
+
+
+class AsyncTwitchClient(BaseTwitchClient):
+    """
+    Variante asyncio (aiohttp) : un seul pool de connexions partagé, et
+    autant de polls / refresh de token en vol que nécessaire sans un
+    thread par chaîne. À utiliser dans un `async with`.
+    """
+
+    def __init__(self, *args, pool_size=10, **kwargs):
+        if not AIOHTTP_OK:
+            raise ImportError("AsyncTwitchClient requires aiohttp: pip install aiohttp")
+        super().__init__(*args, **kwargs)
+        self.pool_size = pool_size
+        self.session = None
+        self.token_lock = asyncio.Lock()
+
+    async def __aenter__(self):
+        self.session = aiohttp.ClientSession(
+            connector=aiohttp.TCPConnector(limit=self.pool_size),
+            timeout=aiohttp.ClientTimeout(total=15),
+        )
+        return self
+
+    async def __aexit__(self, *exc):
+        await self.session.close()
+
+    async def fetch_access_token(self, force=False):
+        # Un seul refresh en vol même si plusieurs polls reçoivent un 401 en même temps
+        async with self.token_lock:
+            if not force:
+                cached = self.cached_token()
+                if cached:
+                    self.access_token = cached
+                    return cached
+
+            async with self.session.post(self.token_url, params=self.token_params) as r:
+                r.raise_for_status()
+                return self.store_token(await r.json())
+
+    async def check_batch(self, batch, statuses):
+        delay = self.ratelimit_delay()
+        if delay > 0:
+            await asyncio.sleep(delay)
+        try:
+            async with self.session.get(
+                self.streams_url,
+                params=[("user_login", username) for username in batch],
+                headers=self.headers(),
+            ) as r:
+                self.update_ratelimit(r.headers)
+                if r.status != 200:
+                    for username in batch:
+                        statuses[username] = (self.status_for_code(r.status), None)
+                    return
+                self.parse_streams(batch, await r.json(), statuses)
+
+        except (aiohttp.ClientError, asyncio.TimeoutError):
+            for username in batch:
+                statuses[username] = (TwitchResponseStatus.ERROR, None)
+
+    async def check_users(self, usernames):
+        """Tous les lots de HELIX_BATCH_SIZE chaînes sont envoyés en parallèle."""
+        statuses = {}
+        await asyncio.gather(*(self.check_batch(batch, statuses) for batch in self.batches(usernames)))
+        return statuses
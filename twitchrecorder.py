@@ -1,158 +1,716 @@
 import datetime
-import enum
 import getopt
+import json
 import logging
+import math
 import os
 import subprocess
 import sys
 import shutil
+import threading
 import time
-import requests
+from concurrent.futures import ThreadPoolExecutor
 import config
+from compression import CompressionQueue
+import metrics
+from catalogue import Catalogue
+from encoding import (
+    DEFAULT_RENDITIONS, PresetPolicy, build_previews, ladder_args, package_hls, probe_duration, rendition_outputs
+)
+from scheduler import PollScheduler
+from storage import EVICT_OLDEST, StorageManager
+from twitch_client import API_URL, AUTH_URL, TwitchClient, TwitchResponseStatus
 
-class TwitchResponseStatus(enum.Enum):
-    ONLINE = 0
-    OFFLINE = 1
-    NOT_FOUND = 2
-    UNAUTHORIZED = 3
-    ERROR = 4
+POLL_SECONDS = metrics.REGISTRY.register(metrics.Histogram(
+    "twitch_poll_seconds", "Duration of a Helix polling round"))
+POLL_STATUS = metrics.REGISTRY.register(metrics.Counter(
+    "twitch_poll_status_total", "Channel poll results by TwitchResponseStatus", ["status"]))
+ACTIVE_RECORDINGS = metrics.REGISTRY.register(metrics.Gauge(
+    "recorder_active_recordings", "Recordings currently running"))
+RECORDING_BYTES_PER_SECOND = metrics.REGISTRY.register(metrics.Gauge(
+    "recorder_recording_bytes_per_second", "Bytes written per second by each recording", ["channel"]))
+COMPRESSION_QUEUE_DEPTH = metrics.REGISTRY.register(metrics.Gauge(
+    "recorder_compression_queue_depth", "Compression jobs waiting for a worker"))
+FFMPEG_SPEED = metrics.REGISTRY.register(metrics.Gauge(
+    "ffmpeg_speed_ratio", "ffmpeg speed= (media time / wall time) per running job", ["job"]))
+FFMPEG_FPS = metrics.REGISTRY.register(metrics.Gauge(
+    "ffmpeg_fps", "ffmpeg fps= per running job", ["job"]))
+
+class RecordingJob(threading.Thread):
+    def __init__(self, recorder, username, info):
+        super().__init__(name="record-" + username, daemon=True)
+        self.recorder = recorder
+        self.username = username
+        self.info = info
+        # Fichier ou dossier qui grossit pendant l'enregistrement (métrique débit)
+        self.output_path = None
+
+    def run(self):
+        try:
+            self.recorder.record(self.username, self)
+        except Exception as e:
+            logging.error("%s: recording job failed: %s", self.username, e)
+        finally:
+            # Helix annonce encore le stream un moment après sa fin : pas de repoll immédiat
+            self.recorder.scheduler.schedule(self.username, time.time(), delay=self.recorder.refresh)
 
 class TwitchRecorder:
     def __init__(self):
         self.ffmpeg_path = "ffmpeg"
+        self.ffprobe_path = "ffprobe"
         self.refresh = 15
         self.root_path = config.root_path
 
-        self.username = config.username
+        # config.usernames (liste) active le mode multi-chaînes,
+        # sinon on garde le comportement historique avec config.username
+        self.usernames = list(getattr(config, "usernames", None) or [config.username])
+        self.username = self.usernames[0]
         self.quality = "best"
+        # Mode streaming : streamlink -> ffmpeg sans fichier pleine qualité intermédiaire
+        self.live_transcode = getattr(config, "live_transcode", False)
+        self.keep_original = getattr(config, "keep_original", False)
+        # Mode segmenté : durée des segments en secondes (ex. 600), None = fichier unique
+        self.segment_length = getattr(config, "segment_length", None)
+        # Échelle de renditions : [{"name", "height", "crf", "preset", "audio_bitrate"}, ...]
+        self.renditions = getattr(config, "renditions", None) or DEFAULT_RENDITIONS
+        # Taille des morceaux de compression (s) : point de reprise après un crash
+        self.compression_chunk = getattr(config, "compression_chunk", 600)
+        # Preset choisi selon la file de compression : dict PresetPolicy ou JSON de encoder_bench.py
+        self.preset_policy = self.load_preset_policy(getattr(config, "auto_preset", None))
+        # Poster + sprites de prévisualisation générés pendant l'encodage
+        self.previews = getattr(config, "previews", True)
+        # Empaquetage HLS (fMP4) optionnel des vidéos compressées
+        self.hls = getattr(config, "hls", False)
+        # Aperçu HLS (remux, sans réencodage) des enregistrements en cours dans live/<user>/
+        self.live_preview = getattr(config, "live_preview", False)
+        self.live_path = os.path.join(self.root_path, "live")
+        self.live = {}
+        self.live_lock = threading.Lock()
+        self.recordings = {}
+        self.scheduler = PollScheduler(
+            os.path.join(self.root_path, "schedule_history.json"),
+            self.usernames,
+            self.refresh,
+            min_interval=getattr(config, "poll_min_interval", 5),
+            max_interval=getattr(config, "poll_max_interval", 120),
+        )
 
-        self.client_id = config.client_id
-        self.client_secret = config.client_secret
-        self.token_url = (
-            "https://id.twitch.tv/oauth2/token"
-            "?client_id=" + self.client_id +
-            "&client_secret=" + self.client_secret +
-            "&grant_type=client_credentials"
+        self.compression_queue = CompressionQueue(
+            self.compress_video,
+            os.path.join(self.root_path, "compression_jobs.json"),
+            workers=getattr(config, "compression_workers", None),
         )
-        self.url = "https://api.twitch.tv/helix/streams"
-        self.access_token = self.fetch_access_token()
+        self.catalogue = Catalogue(self.root_path, self.ffprobe_path)
+        # Budget disque : tout est désactivé tant qu'aucun quota / seuil n'est configuré
+        self.recording_reserve = getattr(config, "recording_reserve", 0)
+        self.storage = StorageManager(
+            self.root_path,
+            self.usernames,
+            global_quota=getattr(config, "storage_quota", None),
+            channel_quota=getattr(config, "channel_quota", None),
+            low_watermark=getattr(config, "low_watermark", 0),
+            policy=getattr(config, "eviction_policy", EVICT_OLDEST),
+            protected=self.protected_paths,
+            on_evict=self.catalogue.remove,
+        )
+        self.segment_pool = ThreadPoolExecutor(
+            max_workers=self.compression_queue.workers,
+            thread_name_prefix="segment",
+        )
+        # Plafond commun aux encodages de la file et des segments : jamais plus
+        # de compression_queue.workers ffmpeg libx264 en même temps
+        self.encode_slots = threading.BoundedSemaphore(self.compression_queue.workers)
+
+        self.client = TwitchClient(
+            config.client_id,
+            config.client_secret,
+            token_cache=os.path.join(self.root_path, "twitch_token.json"),
+            api_url=getattr(config, "helix_url", API_URL),
+            auth_url=getattr(config, "auth_url", AUTH_URL),
+        )
+        self.client.fetch_access_token()
+
+    def load_preset_policy(self, auto_preset):
+        if isinstance(auto_preset, dict):
+            return PresetPolicy(**auto_preset)
+        if isinstance(auto_preset, str):
+            with open(auto_preset, encoding="utf-8") as f:
+                bench = json.load(f)
+            return PresetPolicy.from_benchmark(bench["summary"], bench.get("min_ssim", 0.95),
+                                               crf=self.renditions[0]["crf"])
+        return None
 
-    def fetch_access_token(self):
-        token_response = requests.post(self.token_url, timeout=15)
-        token_response.raise_for_status()
-        return token_response.json()["access_token"]
+    def channel_paths(self, username):
+        recorded_path = os.path.join(self.root_path, "recorded", username)
+        processed_path = os.path.join(self.root_path, "processed", username)
+        return recorded_path, processed_path
 
     def run(self):
-        recorded_path = os.path.join(self.root_path, "recorded", self.username)
-        processed_path = os.path.join(self.root_path, "processed", self.username)
+        for username in self.usernames:
+            recorded_path, processed_path = self.channel_paths(username)
+            os.makedirs(recorded_path, exist_ok=True)
+            os.makedirs(processed_path, exist_ok=True)
 
-        os.makedirs(recorded_path, exist_ok=True)
-        os.makedirs(processed_path, exist_ok=True)
+        self.compression_queue.start()
+        self.compression_queue.recover([self.channel_paths(u) for u in self.usernames])
+        self.recover_segments()
 
-        logging.info("Monitoring %s every %s seconds", self.username, self.refresh)
+        metrics_port = getattr(config, "metrics_port", None)
+        if metrics_port:
+            ACTIVE_RECORDINGS.function = lambda: sum(job.is_alive() for job in self.recordings.values())
+            COMPRESSION_QUEUE_DEPTH.function = self.compression_queue.depth
+            metrics.start_server(metrics_port)
+            threading.Thread(target=self.sample_recordings, name="metrics-sampler", daemon=True).start()
 
-        self.loop_check(recorded_path, processed_path)
+        threading.Thread(target=self.watch_storage, name="storage", daemon=True).start()
+
+        if self.live_preview:
+            # Un aperçu resté d'un crash ne correspond plus à aucun enregistrement
+            shutil.rmtree(self.live_path, ignore_errors=True)
+            self.save_live_index()
+
+        logging.info("Monitoring %s every %s seconds", ", ".join(self.usernames), self.refresh)
+
+        self.loop_check()
 
     def compress_video(self, input_file, output_file):
+        """
+        Compression reprenable : la source est encodée par morceaux de
+        compression_chunk secondes dans <sortie>.work/, chaque morceau terminé
+        servant de point de reprise. L'original n'est supprimé qu'après
+        vérification et renommage atomique de la sortie.
+        """
+        work_dir = os.path.splitext(output_file)[0] + ".work"
         try:
-            logging.info("Starting 480p compression...")
+            duration = probe_duration(input_file, self.ffprobe_path)
+            os.makedirs(work_dir, exist_ok=True)
 
-            # On capture le code de retour pour vérifier si FFmpeg réussit
-            return_code = subprocess.call([
-                self.ffmpeg_path,
-                "-y",
-                "-i", input_file,
-                "-vf", "scale=-2:480",
-                "-c:v", "libx264",
-                "-preset", "veryfast",
-                "-crf", "30",
-                "-profile:v", "high",
-                "-level", "3.1",
-                "-pix_fmt", "yuv420p", # CORRECTION : minuscule ici
-                "-movflags", "+faststart",
-                "-c:a", "aac",
-                "-b:a", "64k",
-                output_file
-            ])
+            # Le découpage est figé à la création du job pour que la reprise retombe sur les mêmes morceaux
+            job_file = os.path.join(work_dir, "job.json")
+            # (même preset aussi : des morceaux aux réglages différents se concatènent mal)
+            if os.path.exists(job_file):
+                with open(job_file, encoding="utf-8") as f:
+                    job = json.load(f)
+                chunk = job["chunk"]
+                renditions = job.get("renditions", self.renditions)
+            else:
+                chunk = self.compression_chunk
+                renditions = self.renditions
+                if self.preset_policy:
+                    renditions = self.preset_policy.apply(renditions, self.compression_queue.depth())
+                with open(job_file, "w", encoding="utf-8") as f:
+                    json.dump({"input": input_file, "duration": duration, "chunk": chunk,
+                               "renditions": renditions}, f)
+
+            chunks = max(1, math.ceil(duration / chunk))
+            logging.info("Starting compression of %s (%s chunks, %s)...", input_file, chunks,
+                         ", ".join("%s/%s" % (r["name"], r["preset"]) for r in renditions))
+
+            encoded_files = []
+            for index in range(chunks):
+                encoded_file = os.path.join(work_dir, "chunk_%05d.enc.ts" % index)
+                if os.path.exists(encoded_file):
+                    logging.info("  chunk %s/%s already encoded, resuming", index + 1, chunks)
+                else:
+                    self.encode_chunk(input_file, encoded_file, start=index * chunk, duration=chunk,
+                                      renditions=renditions,
+                                      label="%s#%d" % (os.path.basename(output_file), index))
+                encoded_files.append(encoded_file)
 
-            # Sécurité : On ne supprime que si FFmpeg a terminé sans erreur (code 0)
-            if return_code == 0:
+            results = self.concat_renditions(work_dir, encoded_files, output_file, duration, renditions)
+
+            # Sécurité : On ne supprime que si la sortie a été vérifiée puis renommée
+            if results is not None:
                 logging.info("Compression finished successfully. Removing original file.")
                 os.remove(input_file)
-            else:
-                logging.error("FFmpeg failed with return code %s. Original file preserved.", return_code)
+                self.storage.forget(input_file)
+                shutil.rmtree(work_dir)
+                return results
 
         except Exception as e:
-            logging.error("Compression error: %s", e)
+            logging.error("Compression error: %s. Original file preserved, progress kept in %s.", e, work_dir)
+
+        return None
+
+    def encode_chunk(self, input_file, encoded_file, start=None, duration=None, renditions=None, label=None):
+        # Sortie en .part puis renommage : un morceau encodé présent est forcément complet
+        outputs = rendition_outputs(renditions or self.renditions, encoded_file)
+        command = [self.ffmpeg_path, "-y", "-loglevel", "error"]
+        if start is not None:
+            command += ["-ss", str(start), "-t", str(duration)]
+        command += ["-i", input_file] + ladder_args(
+            [(rendition, path + ".part") for rendition, path in outputs],
+            faststart=False,
+            container="mpegts",
+            thumbnails=self.thumbnail_pattern(encoded_file),
+        )
+        with self.encode_slots:
+            # Label unique par job : 'chunk_00000.enc.ts' seul est le même pour tous les jobs en cours
+            label = label or "%s/%s" % (os.path.basename(os.path.dirname(encoded_file)), os.path.basename(encoded_file))
+            return_code = self.run_ffmpeg(command, label)
+        if return_code != 0:
+            raise RuntimeError("ffmpeg failed on %s with return code %s" % (input_file, return_code))
+        # La rendition principale est renommée en dernier : elle sert de marqueur de fin
+        for _, path in reversed(outputs):
+            os.replace(path + ".part", path)
+        return outputs
+
+    def thumbnail_pattern(self, encoded_file):
+        if not self.previews:
+            return None
+        return encoded_file[:-len(".enc.ts")] + ".thumb_%04d.jpg"
+
+    def chunk_thumbnails(self, encoded_files):
+        """
+        [(début du morceau, vignettes)] : les segments, coupés sur les images-clés,
+        ne durent pas exactement segment_length, d'où la durée réelle cumulée.
+        """
+        chunks = []
+        offset = 0.0
+        for encoded_file in encoded_files:
+            prefix = os.path.basename(encoded_file[:-len(".enc.ts")]) + ".thumb_"
+            directory = os.path.dirname(encoded_file)
+            chunks.append((offset, sorted(
+                os.path.join(directory, name)
+                for name in os.listdir(directory)
+                if name.startswith(prefix) and name.endswith(".jpg")
+            )))
+            offset += probe_duration(encoded_file, self.ffprobe_path)
+        return chunks
+
+    def concat_renditions(self, work_dir, encoded_files, output_file, expected_duration=None, renditions=None):
+        """
+        Concaténation sans réencodage par rendition, vérifiée par ffprobe puis renommée atomiquement.
+        renditions : celles avec lesquelles les morceaux ont été encodés (figées dans job.json).
+        """
+        renditions = renditions or self.renditions
+        if self.previews:
+            build_previews(self.chunk_thumbnails(encoded_files), output_file, self.ffmpeg_path)
+
+        outputs = rendition_outputs(renditions, output_file)
+        for index, (rendition, path) in enumerate(outputs):
+            concat_list = os.path.join(work_dir, "concat.%s.txt" % rendition["name"])
+            with open(concat_list, "w", encoding="utf-8") as f:
+                for encoded_file in encoded_files:
+                    part = rendition_outputs(renditions, encoded_file)[index][1]
+                    f.write("file '%s'\n" % os.path.basename(part))
+
+            return_code = subprocess.call([
+                self.ffmpeg_path, "-y", "-loglevel", "error",
+                "-f", "concat", "-safe", "0",
+                "-i", concat_list,
+                "-c", "copy",
+                "-bsf:a", "aac_adtstoasc",
+                "-movflags", "+faststart",
+                "-f", "mp4",
+                path + ".part"
+            ])
+            if return_code != 0:
+                logging.error("Concat failed with return code %s. Work files preserved in %s.", return_code, work_dir)
+                return None
+
+            duration = probe_duration(path + ".part", self.ffprobe_path)
+            if expected_duration is not None and abs(duration - expected_duration) > max(2.0, expected_duration * 0.01):
+                logging.error("%s: output lasts %.1fs instead of %.1fs. Work files preserved in %s.",
+                              rendition["name"], duration, expected_duration, work_dir)
+                return None
+
+        for _, path in outputs:
+            os.replace(path + ".part", path)
+        return self.report_renditions(outputs)
 
-    def check_user(self):
+    def report_renditions(self, outputs):
+        results = {}
+        for rendition, path in outputs:
+            self.storage.track(path)
+            size = os.path.getsize(path)
+            results[rendition["name"]] = {"file": path, "size": size}
+            logging.info("  %s: %s (%.1f MB)", rendition["name"], path, size / 1e6)
+        if self.hls:
+            try:
+                logging.info("  HLS: %s", package_hls(outputs, self.ffmpeg_path, self.ffprobe_path))
+                # L'arborescence HLS compte dans les quotas avec sa vidéo principale
+                self.storage.track(outputs[0][1])
+            except Exception as e:
+                # Le mp4 reste servi normalement : l'échec HLS n'est pas bloquant
+                logging.error("HLS packaging error: %s", e)
+        self.catalogue.add(outputs)
+        return results
+
+    def check_user(self, username=None):
+        statuses = self.check_users([username or self.username])
+        return next(iter(statuses.values()))
+
+    def check_users(self, usernames):
+        return self.client.check_users(usernames)
+
+    def run_ffmpeg(self, command, job, stdin=None):
+        """Lance ffmpeg avec -progress sur stdout pour exposer speed= et fps= dans les métriques."""
+        process = subprocess.Popen(
+            command[:1] + ["-progress", "pipe:1", "-nostats"] + command[1:],
+            stdin=stdin,
+            stdout=subprocess.PIPE,
+            text=True,
+        )
+        if stdin is not None:
+            # Le parent ferme sa copie du pipe pour que ffmpeg voie la fin du flux
+            stdin.close()
         try:
-            headers = {
-                "Client-ID": self.client_id,
-                "Authorization": "Bearer " + self.access_token
+            for line in process.stdout:
+                key, _, value = line.strip().partition("=")
+                try:
+                    if key == "fps":
+                        FFMPEG_FPS.set(float(value), job=job)
+                    elif key == "speed":
+                        FFMPEG_SPEED.set(float(value.rstrip("x")), job=job)
+                except ValueError:
+                    # speed=N/A au démarrage
+                    pass
+        finally:
+            FFMPEG_FPS.remove(job=job)
+            FFMPEG_SPEED.remove(job=job)
+        return process.wait()
+
+    def protected_paths(self):
+        paths = {job.output_path for job in list(self.recordings.values()) if job.is_alive()}
+        paths.update(job["input"] for job in list(self.compression_queue.jobs))
+        return paths
+
+    def watch_storage(self):
+        # Vérifie le seuil bas pendant les enregistrements : le disque ne doit jamais se remplir en plein stream
+        while True:
+            try:
+                self.storage.ensure_space()
+            except Exception as e:
+                # Le watcher doit survivre à une erreur disque passagère
+                logging.error("Storage check failed: %s", e)
+            time.sleep(self.refresh)
+
+    def sample_recordings(self):
+        previous = {}
+        while True:
+            now = time.time()
+            for username, job in list(self.recordings.items()):
+                if not job.is_alive() or not job.output_path or not os.path.exists(job.output_path):
+                    RECORDING_BYTES_PER_SECOND.remove(channel=username)
+                    previous.pop(username, None)
+                    continue
+                if os.path.isdir(job.output_path):
+                    size = sum(entry.stat().st_size for entry in os.scandir(job.output_path) if entry.is_file())
+                else:
+                    size = os.path.getsize(job.output_path)
+                if username in previous:
+                    last_time, last_size = previous[username]
+                    RECORDING_BYTES_PER_SECOND.set((size - last_size) / (now - last_time), channel=username)
+                previous[username] = (now, size)
+            for username in set(previous) - set(self.recordings):
+                RECORDING_BYTES_PER_SECOND.remove(channel=username)
+                del previous[username]
+            time.sleep(self.refresh)
+
+    def record(self, username, job=None):
+        recorded_path, processed_path = self.channel_paths(username)
+
+        filename = (
+            username + " - " +
+            datetime.datetime.now().strftime("%Y-%m-%d_%H-%M-%S") +
+            ".mp4"
+        )
+
+        recorded_file = os.path.join(recorded_path, filename)
+        processed_file = os.path.join(processed_path, filename)
+
+        if self.live_transcode:
+            if job:
+                # record_live écrit dans 'x.mp4.part' jusqu'à la fin du stream
+                job.output_path = processed_file + ".part"
+            self.record_live(username, recorded_file, processed_file)
+            return
+
+        if self.segment_length:
+            if job:
+                job.output_path = recorded_file[:-len(".mp4")] + ".segments"
+            self.record_segmented(username, recorded_file, processed_file)
+            return
+
+        if job:
+            job.output_path = recorded_file
+
+        if self.live_preview:
+            # Même contenu que streamlink -o (MPEG-TS), plus la sortie HLS
+            streamlink = self.open_stream(username)
+            ffmpeg = subprocess.Popen(
+                [self.ffmpeg_path, "-y", "-loglevel", "error", "-i", "pipe:0",
+                 "-map", "0", "-c", "copy", "-f", "mpegts", recorded_file] +
+                self.start_live_preview(username),
+                stdin=streamlink.stdout,
+            )
+            streamlink.stdout.close()
+            ffmpeg.wait()
+            streamlink.wait()
+            self.stop_live_preview(username)
+        else:
+            # Enregistrement via Streamlink
+            subprocess.call([
+                "streamlink",
+                "--twitch-disable-ads",
+                "twitch.tv/" + username,
+                self.quality,
+                "-o", recorded_file
+            ])
+
+        logging.info("%s: stream ended. Queuing compression...", username)
+
+        # La compression part dans le pool : la chaîne est de nouveau surveillée au prochain tour
+        if os.path.exists(recorded_file):
+            self.storage.track(recorded_file)
+            self.compression_queue.submit(recorded_file, processed_file)
+
+    def open_stream(self, username):
+        return subprocess.Popen([
+            "streamlink",
+            "--twitch-disable-ads",
+            "twitch.tv/" + username,
+            self.quality,
+            "-O"
+        ], stdout=subprocess.PIPE)
+
+    def start_live_preview(self, username):
+        """
+        Arguments ffmpeg d'une sortie HLS supplémentaire (remux du flux reçu) :
+        playlist 'event' qui garde tout depuis le début, pour regarder en direct
+        ou depuis le début. Renvoie [] si l'aperçu est désactivé.
+        """
+        if not self.live_preview:
+            return []
+        live_dir = os.path.join(self.live_path, username)
+        shutil.rmtree(live_dir, ignore_errors=True)
+        os.makedirs(live_dir)
+        with self.live_lock:
+            self.live[username] = {
+                "channel": username,
+                "started": datetime.datetime.now().isoformat(timespec="seconds"),
+                "playlist": "/live/%s/index.m3u8" % username,
             }
-            r = requests.get(
-                self.url + "?user_login=" + self.username,
-                headers=headers,
-                timeout=15
+            self.save_live_index()
+        return [
+            "-map", "0", "-c", "copy",
+            "-f", "hls",
+            "-hls_time", "4",
+            "-hls_playlist_type", "event",
+            "-hls_segment_filename", os.path.join(live_dir, "seg_%05d.ts"),
+            os.path.join(live_dir, "index.m3u8"),
+        ]
+
+    def stop_live_preview(self, username):
+        if not self.live_preview:
+            return
+        with self.live_lock:
+            self.live.pop(username, None)
+            self.save_live_index()
+        shutil.rmtree(os.path.join(self.live_path, username), ignore_errors=True)
+
+    def save_live_index(self):
+        os.makedirs(self.live_path, exist_ok=True)
+        index_file = os.path.join(self.live_path, "live.json")
+        with open(index_file + ".tmp", "w", encoding="utf-8") as f:
+            json.dump({"recordings": list(self.live.values())}, f)
+        os.replace(index_file + ".tmp", index_file)
+
+    def record_live(self, username, recorded_file, processed_file):
+        streamlink = self.open_stream(username)
+
+        outputs = rendition_outputs(self.renditions, processed_file)
+        thumbs_dir = os.path.splitext(processed_file)[0] + ".thumbs"
+        thumbnails = None
+        if self.previews:
+            os.makedirs(thumbs_dir, exist_ok=True)
+            thumbnails = os.path.join(thumbs_dir, "thumb_%06d.jpg")
+        # Sorties en .part puis renommage : un crash en plein stream ne laisse jamais
+        # un mp4 sans moov que recover, le catalogue ou la transcription prendraient pour fini
+        command = [self.ffmpeg_path, "-y", "-i", "pipe:0"] + ladder_args(
+            [(rendition, path + ".part") for rendition, path in outputs],
+            container="mp4",
+            thumbnails=thumbnails,
+        )
+        if self.keep_original:
+            # Tee optionnel : copie sans réencodage du flux source
+            command += ["-map", "0", "-c", "copy", recorded_file]
+        command += self.start_live_preview(username)
+
+        return_code = self.run_ffmpeg(command, os.path.basename(processed_file), stdin=streamlink.stdout)
+        streamlink.wait()
+        self.stop_live_preview(username)
+
+        if thumbnails:
+            build_previews(
+                [(0, sorted(os.path.join(thumbs_dir, name) for name in os.listdir(thumbs_dir)))],
+                processed_file,
+                self.ffmpeg_path,
             )
-            r.raise_for_status()
-            info = r.json()
+            shutil.rmtree(thumbs_dir)
 
-            if not info["data"]:
-                return TwitchResponseStatus.OFFLINE, None
-            else:
-                return TwitchResponseStatus.ONLINE, info
+        if return_code == 0:
+            for _, path in outputs:
+                os.replace(path + ".part", path)
+            logging.info("%s: stream ended, live transcode finished:", username)
+            self.report_renditions(outputs)
+            if os.path.exists(recorded_file):
+                self.storage.track(recorded_file)
+        else:
+            logging.error("%s: live transcode failed with return code %s", username, return_code)
+            for _, path in outputs:
+                if os.path.exists(path + ".part"):
+                    os.remove(path + ".part")
+            if os.path.exists(recorded_file):
+                self.compression_queue.submit(recorded_file, processed_file)
 
-        except requests.exceptions.RequestException as e:
-            if e.response and e.response.status_code == 401:
-                return TwitchResponseStatus.UNAUTHORIZED, None
-            return TwitchResponseStatus.ERROR, None
+    def encoded_segment(self, segment_file):
+        return segment_file[:-len(".ts")] + ".enc.ts"
 
-    def loop_check(self, recorded_path, processed_path):
-        while True:
-            status, info = self.check_user()
+    def compress_segment(self, segment_file):
+        return self.encode_chunk(segment_file, self.encoded_segment(segment_file))
 
-            if status == TwitchResponseStatus.OFFLINE:
-                logging.info("%s currently offline, checking again in %s seconds", self.username, self.refresh)
-                time.sleep(self.refresh)
+    def record_segmented(self, username, recorded_file, processed_file):
+        segments_dir = recorded_file[:-len(".mp4")] + ".segments"
+        os.makedirs(segments_dir, exist_ok=True)
+        segment_list = os.path.join(segments_dir, "segments.txt")
 
-            elif status == TwitchResponseStatus.UNAUTHORIZED:
-                logging.info("Refreshing Twitch token...")
-                self.access_token = self.fetch_access_token()
+        streamlink = self.open_stream(username)
+
+        # mpegts : un crash ne corrompt que le segment en cours
+        ffmpeg = subprocess.Popen([
+            self.ffmpeg_path, "-y", "-loglevel", "error",
+            "-i", "pipe:0",
+            "-c", "copy",
+            "-f", "segment",
+            "-segment_time", str(self.segment_length),
+            "-segment_format", "mpegts",
+            "-reset_timestamps", "1",
+            "-segment_list", segment_list,
+            "-segment_list_type", "flat",
+            os.path.join(segments_dir, "seg_%05d.ts")
+        ] + self.start_live_preview(username), stdin=streamlink.stdout)
+        streamlink.stdout.close()
+
+        # ffmpeg n'ajoute un segment à la liste qu'une fois celui-ci fermé
+        futures = {}
+        while ffmpeg.poll() is None:
+            self.submit_closed_segments(segments_dir, segment_list, futures)
+            time.sleep(self.refresh)
+        streamlink.wait()
+        self.stop_live_preview(username)
 
-            elif status == TwitchResponseStatus.ERROR:
-                logging.error("API error, retrying in 60 seconds")
-                time.sleep(60)
+        logging.info("%s: stream ended, finishing segments...", username)
+        self.finish_segments(segments_dir, processed_file, futures)
 
-            elif status == TwitchResponseStatus.ONLINE:
-                logging.info("User ONLINE. Recording...")
+    def closed_segments(self, segments_dir, segment_list):
+        if not os.path.exists(segment_list):
+            return []
+        with open(segment_list, encoding="utf-8") as f:
+            return [os.path.join(segments_dir, line.strip()) for line in f if line.strip()]
 
-                filename = (
-                    self.username + " - " +
-                    datetime.datetime.now().strftime("%Y-%m-%d_%H-%M-%S") +
-                    ".mp4"
-                )
+    def submit_closed_segments(self, segments_dir, segment_list, futures):
+        for segment_file in self.closed_segments(segments_dir, segment_list):
+            if segment_file not in futures:
+                futures[segment_file] = self.segment_pool.submit(self.compress_segment, segment_file)
 
-                recorded_file = os.path.join(recorded_path, filename)
-                processed_file = os.path.join(processed_path, filename)
+    def finish_segments(self, segments_dir, processed_file, futures=None):
+        """Compresse les segments restants puis concatène sans réencodage."""
+        segment_files = sorted(
+            os.path.join(segments_dir, name)
+            for name in os.listdir(segments_dir)
+            if name.startswith("seg_") and name.endswith(".ts") and ".enc." not in name
+        )
+        futures = futures or {}
+        for segment_file in segment_files:
+            if segment_file not in futures and not os.path.exists(self.encoded_segment(segment_file)):
+                futures[segment_file] = self.segment_pool.submit(self.compress_segment, segment_file)
+
+        encoded_files = []
+        for segment_file in segment_files:
+            try:
+                if segment_file in futures:
+                    futures[segment_file].result()
+                encoded_files.append(self.encoded_segment(segment_file))
+            except Exception as e:
+                # Segment illisible (typiquement le dernier après un crash) : on le saute
+                logging.error("Skipping segment %s: %s", segment_file, e)
+
+        if not encoded_files:
+            logging.error("No usable segment in %s", segments_dir)
+            return None
+
+        results = self.concat_renditions(segments_dir, encoded_files, processed_file)
+        if results is not None:
+            logging.info("Segments concatenated. Removing segments.")
+            shutil.rmtree(segments_dir)
+        return results
+
+    def recover_segments(self):
+        for username in self.usernames:
+            recorded_path, processed_path = self.channel_paths(username)
+            for name in sorted(os.listdir(recorded_path)):
+                if not name.endswith(".segments"):
+                    continue
+                segments_dir = os.path.join(recorded_path, name)
+                processed_file = os.path.join(processed_path, name[:-len(".segments")] + ".mp4")
+                logging.info("Recovering segmented recording %s", segments_dir)
+                threading.Thread(
+                    target=self.finish_segments,
+                    args=(segments_dir, processed_file),
+                    daemon=True,
+                ).start()
 
-                # Enregistrement via Streamlink
-                subprocess.call([
-                    "streamlink",
-                    "--twitch-disable-ads",
-                    "twitch.tv/" + self.username,
-                    self.quality,
-                    "-o", recorded_file
-                ])
+    def loop_check(self):
+        while True:
+            # On ne réinterroge pas les chaînes déjà en cours d'enregistrement
+            self.recordings = {
+                username: job
+                for username, job in self.recordings.items()
+                if job.is_alive()
+            }
+            now = time.time()
+            usernames = [u for u in self.scheduler.due(now) if u not in self.recordings]
+            if not usernames:
+                time.sleep(max(1.0, self.scheduler.sleep_time(now)))
+                continue
+
+            start = time.perf_counter()
+            statuses = self.check_users(usernames)
+            POLL_SECONDS.observe(time.perf_counter() - start)
+            results = [status for status, _ in statuses.values()]
+            for status in results:
+                POLL_STATUS.inc(status=status.name)
+
+            if TwitchResponseStatus.UNAUTHORIZED in results:
+                logging.info("Refreshing Twitch token...")
+                self.client.fetch_access_token(force=True)
+                continue
 
-                logging.info("Stream ended. Starting compression...")
+            now = time.time()
+            for username, (status, info) in statuses.items():
+                if status == TwitchResponseStatus.ONLINE:
+                    logging.info("%s ONLINE. Recording...", username)
+                    # On enregistre quand même : un début de stream vaut mieux que rien
+                    if not self.storage.ensure_space(username, self.recording_reserve):
+                        logging.error("%s: recording with less than the configured free space", username)
+                    self.scheduler.record_start(username, info["data"][0].get("started_at"))
+                    job = RecordingJob(self, username, info)
+                    self.recordings[username] = job
+                    # Replanifiée par RecordingJob.run à la fin de l'enregistrement
+                    self.scheduler.schedule(username, now, delay=self.refresh)
+                    job.start()
 
-                if os.path.exists(recorded_file):
-                    self.compress_video(recorded_file, processed_file)
+                elif status == TwitchResponseStatus.OFFLINE:
+                    delay = self.scheduler.schedule(username, now)
+                    logging.info("%s currently offline, checking again in %.0f seconds", username, delay)
 
-                logging.info("Back to monitoring...")
-                time.sleep(self.refresh)
+                else:
+                    # 429 : on attend le reset annoncé par Helix plutôt qu'un délai fixe
+                    delay = max(1, self.client.ratelimit_reset - now) if self.client.ratelimit_remaining == 0 else 60
+                    self.scheduler.schedule(username, now, delay=delay)
+                    logging.error("%s: API error, retrying in %.0f seconds", username, delay)
 
 def main(argv):
     logging.basicConfig(level=logging.INFO, format='%(message)s')